@@ -0,0 +1,243 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from columnar_store import read_table
+from domain import identify_and_name_data_domains, identify_data_domains_by_workflow, consolidate_similar_domains
+from erd import create_mermaid_code
+from graph_domain import create_domain_entity_graph, visualize_graph
+from knowledge_loader import iter_sources
+from synthetic_ccm import write_synthetic_ccm
+
+RESULTS_PATH = '../results/benchmarks/benchmark.json'
+
+# Visualization draws every node; above this many domains it is skipped unless raised
+MAX_VISUALIZE_DOMAINS = 5000
+
+# Benchmarks whose output is domain records; their distinct domain counts are reported
+DOMAIN_BENCHMARKS = ('identify_and_name_data_domains', 'identify_data_domains_by_workflow')
+# The sharded domain count may differ from the unsharded one by at most this factor
+MAX_SHARDED_DOMAIN_RATIO = 2.0
+
+# A benchmark times `run(*setup(paths, options))`; setup (reading inputs, building the
+# graph for visualize_graph) is not timed. Benchmarks that do not use domains run once
+# per triple count rather than once per (triples, domains) pair.
+Benchmark = namedtuple('Benchmark', ['name', 'setup', 'run', 'uses_domains'])
+
+def setup_identify(paths, options):
+    return (paths['triples'],), {'n_clusters': options['clusters'], 'method': options['method']}
+
+def setup_identify_by_workflow(paths, options):
+    return (paths['triples'], paths['knowledge']), {'n_clusters': options['clusters'], 'method': options['method']}
+
+def setup_consolidate(paths, options):
+    return (read_table(paths['domains']).to_dict('records'),), {}
+
+def setup_mermaid(paths, options):
+    with open(paths['relationships'], 'r', encoding='utf-8') as f:
+        return (f.read(),), {}
+
+def setup_graph(paths, options):
+    return (paths['domains'],), {}
+
+def setup_visualize(paths, options):
+    G = create_domain_entity_graph(paths['domains'])
+    return (G, os.path.join(options['work_dir'], 'domain_relationships.png')), {'cache_dir': None}
+
+def count_sources(xml_path):
+    return sum(1 for _ in iter_sources([xml_path]))
+
+def setup_sources(paths, options):
+    return (paths['knowledge'],), {}
+
+BENCHMARKS = [
+    Benchmark('iter_sources', setup_sources, count_sources, False),
+    Benchmark('identify_and_name_data_domains', setup_identify, identify_and_name_data_domains, False),
+    Benchmark('identify_data_domains_by_workflow', setup_identify_by_workflow, identify_data_domains_by_workflow,
+              False),
+    Benchmark('consolidate_similar_domains', setup_consolidate, consolidate_similar_domains, True),
+    Benchmark('create_mermaid_code', setup_mermaid, create_mermaid_code, False),
+    Benchmark('create_domain_entity_graph', setup_graph, create_domain_entity_graph, True),
+    Benchmark('visualize_graph', setup_visualize, visualize_graph, True),
+]
+
+def measure(run, args, kwargs, repeat=1, memory=True):
+    """
+    Best wall time over `repeat` runs, then (optionally) one more run under tracemalloc
+    for the peak Python heap. Timing runs are not traced, so tracing overhead never
+    inflates the reported seconds. Returns (seconds, peak bytes, output of the last timed run).
+    """
+    best = float('inf')
+    output = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        output = run(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak, output
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(triple_counts, domain_counts, selected=None, repeat=1, memory=True,
+                   clusters='auto', method='auto', max_visualize_domains=MAX_VISUALIZE_DOMAINS, work_dir=None):
+    """Run every selected benchmark on synthetic CCMs of each size; returns a list of result dicts."""
+    benchmarks = [b for b in BENCHMARKS if not selected or b.name in selected]
+    results = []
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        for n_triples in triple_counts:
+            for i, n_domains in enumerate(domain_counts):
+                data_dir = os.path.join(tmp, f"{n_triples}_{n_domains}")
+                start = time.perf_counter()
+                paths = write_synthetic_ccm(data_dir, n_triples, n_domains)
+                print(f"Generated {n_triples} triples / {n_domains} domains in {time.perf_counter() - start:.1f}s")
+                options = {'clusters': clusters, 'method': method, 'work_dir': data_dir}
+
+                for benchmark in benchmarks:
+                    # Domain-independent benchmarks only run for the first domain count
+                    if not benchmark.uses_domains and i > 0:
+                        continue
+                    result = {'function': benchmark.name, 'triples': n_triples,
+                              'domains': n_domains if benchmark.uses_domains else None}
+                    if benchmark.name == 'visualize_graph' and n_domains > max_visualize_domains:
+                        result['skipped'] = f"more than {max_visualize_domains} domains"
+                    else:
+                        args, kwargs = benchmark.setup(paths, options)
+                        seconds, peak, output = measure(benchmark.run, args, kwargs, repeat, memory)
+                        result.update({'seconds': round(seconds, 6), 'peak_bytes': peak,
+                                       'triples_per_second': round(n_triples / seconds, 1) if seconds else None})
+                        if benchmark.name in DOMAIN_BENCHMARKS:
+                            result['output_domains'] = len({record['Domain name'] for record in output})
+                    print(format_result(result))
+                    results.append(result)
+    return results
+
+def format_result(result):
+    size = f"{result['triples']} triples" + (f", {result['domains']} domains" if result['domains'] else '')
+    if 'skipped' in result:
+        return f"  {result['function']:<32} {size:<32} skipped ({result['skipped']})"
+    memory = f"{result['peak_bytes'] / 2**20:9.1f} MiB" if result['peak_bytes'] is not None else ''
+    return f"  {result['function']:<32} {size:<32} {result['seconds']:10.3f}s {memory}"
+
+def check_domain_counts(results, max_ratio=MAX_SHARDED_DOMAIN_RATIO):
+    """
+    Compare the domain counts of the sharded and unsharded domain identification on each
+    input size. Returns the sizes where they differ by more than max_ratio.
+    """
+    counts = {}
+    for result in results:
+        if 'output_domains' in result:
+            counts.setdefault(result['triples'], {})[result['function']] = result['output_domains']
+    failures = []
+    for n_triples, by_function in sorted(counts.items()):
+        if len(by_function) < len(DOMAIN_BENCHMARKS):
+            continue
+        unsharded, sharded = (by_function[name] for name in DOMAIN_BENCHMARKS)
+        ratio = max(unsharded, sharded) / max(min(unsharded, sharded), 1)
+        status = 'ok' if ratio <= max_ratio else f"more than x{max_ratio:g} apart"
+        print(f"  domains at {n_triples} triples: {unsharded} unsharded, {sharded} by workflow ({status})")
+        if ratio > max_ratio:
+            failures.append(n_triples)
+    return failures
+
+def result_key(result):
+    return result['function'], result['triples'], result['domains']
+
+def compare_results(baseline, results):
+    """Print the time and memory ratio of each result to the matching baseline result."""
+    previous = {result_key(result): result for result in baseline['results']}
+    print(f"Compared to {baseline['meta'].get('git_revision') or 'baseline'} ({baseline['meta']['timestamp']}):")
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None or 'seconds' not in old or 'seconds' not in result:
+            continue
+        line = f"  {result['function']:<32} {result['triples']:>10} {result['domains'] or '':>8}"
+        line += f"  time x{result['seconds'] / old['seconds']:.2f}" if old['seconds'] else ''
+        if old.get('peak_bytes') and result.get('peak_bytes') is not None:
+            line += f"  memory x{result['peak_bytes'] / old['peak_bytes']:.2f}"
+        print(line)
+
+def parse_sizes(value):
+    """Comma-separated sizes; k and M suffixes are accepted (e.g. 1k,100k,10M)."""
+    sizes = []
+    for part in value.split(','):
+        part = part.strip()
+        multiplier = {'k': 1000, 'K': 1000, 'm': 1000000, 'M': 1000000}.get(part[-1:], 1)
+        sizes.append(int(float(part[:-1] if multiplier > 1 else part) * multiplier))
+    return sizes
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the CCM stages on synthetic data of increasing size.")
+    parser.add_argument('--triples', type=parse_sizes, default=[1000, 10000],
+                        help="Triple counts, e.g. 1k,100k,10M")
+    parser.add_argument('--domains', type=parse_sizes, default=[10, 100],
+                        help="Domain counts, e.g. 10,1k,100k")
+    parser.add_argument('--only', nargs='*', choices=[b.name for b in BENCHMARKS],
+                        help="Benchmarks to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=1, help="Timing runs per benchmark; the best is reported")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc run")
+    parser.add_argument('--clusters', default='auto', help="Cluster count for identify_and_name_data_domains")
+    parser.add_argument('--method', default='auto', choices=['auto', 'kmeans', 'minibatch'])
+    parser.add_argument('--max-visualize-domains', type=int, default=MAX_VISUALIZE_DOMAINS)
+    parser.add_argument('--work-dir', default=None, help="Directory for the generated data (default: system temp)")
+    parser.add_argument('--output', default=RESULTS_PATH, help="JSON results file")
+    parser.add_argument('--compare', default=None, help="Earlier results JSON to compare against")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    clusters = args.clusters if args.clusters == 'auto' else int(args.clusters)
+    results = run_benchmarks(args.triples, args.domains, args.only, args.repeat, not args.no_memory,
+                             clusters, args.method, args.max_visualize_domains, args.work_dir)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'clusters': args.clusters,
+            'method': args.method
+        },
+        'results': results
+    }
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare_results(json.load(f), results)
+
+    if check_domain_counts(results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
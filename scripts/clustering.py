@@ -0,0 +1,137 @@
+import math
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from threadpoolctl import threadpool_limits
+
+RANDOM_STATE = 42
+MIN_SEARCH_CLUSTERS = 10   # Smallest upper bound of the automatic k search
+MAX_CANDIDATES = 12        # Number of k values evaluated by the search
+MAX_EXTENSIONS = 3         # Times the search range is doubled when the best k is on its upper edge
+PARALLEL_THRESHOLD = 2000  # Rows below which the k search runs serially (pool startup costs more)
+SILHOUETTE_SAMPLE = 2000   # Rows sampled for silhouette scoring
+MINIBATCH_THRESHOLD = 10000  # Rows above which 'auto' switches to MiniBatchKMeans
+MINIBATCH_SIZE = 4096
+
+# Feature matrix and BLAS/OpenMP thread limit of a k search worker, set once per process by the pool initializer
+_worker_vectors = None
+_worker_limits = None
+
+def make_estimator(method, n_clusters):
+    """Create a clustering estimator for the given backend ('kmeans' or 'minibatch')."""
+    if method == 'kmeans':
+        return KMeans(n_clusters=n_clusters, random_state=RANDOM_STATE, n_init=10)
+    if method == 'minibatch':
+        return MiniBatchKMeans(n_clusters=n_clusters, random_state=RANDOM_STATE,
+                               batch_size=MINIBATCH_SIZE, n_init=3)
+    raise ValueError(f"Unknown clustering method: {method}")
+
+def resolve_method(method, n_samples):
+    """Pick a backend for 'auto': full KMeans for small inputs, MiniBatchKMeans for large ones."""
+    if method == 'auto':
+        return 'minibatch' if n_samples > MINIBATCH_THRESHOLD else 'kmeans'
+    return method
+
+def max_cluster_count(n_samples):
+    """Upper bound of the automatic k search: grows with sqrt(n_samples), at least MIN_SEARCH_CLUSTERS."""
+    return max(MIN_SEARCH_CLUSTERS, math.ceil(math.sqrt(n_samples)))
+
+def candidate_cluster_counts(n_samples, max_clusters=None, max_candidates=MAX_CANDIDATES, lower=2):
+    """Candidate k values in [lower, max_clusters] for the search; log-spaced when the range is wide."""
+    if max_clusters is None:
+        max_clusters = max_cluster_count(n_samples)
+    upper = min(max_clusters, n_samples - 1)
+    if upper < lower:
+        return []
+    if upper - lower < max_candidates:
+        return list(range(lower, upper + 1))
+    return sorted(set(np.geomspace(lower, upper, max_candidates).round().astype(int).tolist()))
+
+def score_cluster_count(vectors, n_clusters, method, sample_size=SILHOUETTE_SAMPLE):
+    """Fit one candidate and score it with a sampled silhouette, which keeps scoring sub-quadratic."""
+    labels = make_estimator(method, n_clusters).fit_predict(vectors)
+    if len(set(labels)) < 2:
+        return n_clusters, -1.0
+    score = silhouette_score(vectors, labels,
+                             sample_size=min(sample_size, vectors.shape[0]),
+                             random_state=RANDOM_STATE)
+    return n_clusters, float(score)
+
+def _init_worker(vectors, n_threads):
+    global _worker_vectors, _worker_limits
+    _worker_vectors = vectors
+    # Each worker's KMeans would otherwise start a thread per CPU and oversubscribe them
+    _worker_limits = threadpool_limits(limits=n_threads)
+
+def _score_in_worker(n_clusters, method, sample_size):
+    return score_cluster_count(_worker_vectors, n_clusters, method, sample_size)
+
+def score_candidates(vectors, candidates, method, n_jobs, sample_size=SILHOUETTE_SAMPLE):
+    """(k, silhouette) for every candidate; across a process pool for large inputs, serially otherwise."""
+    n_workers = min(n_jobs, len(candidates))
+    if n_workers <= 1 or vectors.shape[0] < PARALLEL_THRESHOLD:
+        return [score_cluster_count(vectors, k, method, sample_size) for k in candidates]
+    # The matrix goes to each worker once through the initializer, not with every candidate
+    n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             initializer=_init_worker, initargs=(vectors, n_threads)) as executor:
+        return list(executor.map(
+            _score_in_worker,
+            candidates,
+            [method] * len(candidates),
+            [sample_size] * len(candidates)
+        ))
+
+def best_cluster_count(scores):
+    """Highest silhouette wins; ties go to the smaller k."""
+    return max(scores, key=lambda item: (item[1], -item[0]))[0]
+
+def select_cluster_count(vectors, method='auto', candidates=None, n_jobs=None,
+                         sample_size=SILHOUETTE_SAMPLE):
+    """
+    Choose k by evaluating candidate cluster counts, in parallel across a process pool for large inputs.
+    The default range grows with the input (see max_cluster_count); when the best k lands on its
+    upper edge the range is doubled, up to MAX_EXTENSIONS times, and a warning is printed if the
+    best k is still on the edge.
+    Returns the best k and the list of (k, silhouette) scores.
+    """
+    n_samples = vectors.shape[0]
+    method = resolve_method(method, n_samples)
+    extend = candidates is None
+    if candidates is None:
+        candidates = candidate_cluster_counts(n_samples)
+    if not candidates:
+        return max(n_samples, 1), []
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    scores = score_candidates(vectors, candidates, method, n_jobs, sample_size)
+    best_k = best_cluster_count(scores)
+    upper = max(candidates)
+    for _ in range(MAX_EXTENSIONS if extend else 0):
+        if best_k != upper or upper >= n_samples - 1:
+            break
+        candidates = candidate_cluster_counts(n_samples, 2 * upper, lower=upper + 1)
+        scores += score_candidates(vectors, candidates, method, n_jobs, sample_size)
+        best_k = best_cluster_count(scores)
+        upper = max(candidates)
+    if best_k == upper and upper < n_samples - 1:
+        print(f"Warning: best cluster count {best_k} is the largest one evaluated; "
+              f"pass an explicit cluster count to go higher")
+    return best_k, scores
+
+def fit_clusters(vectors, n_clusters='auto', method='auto', n_jobs=None, sample_size=SILHOUETTE_SAMPLE):
+    """
+    Cluster a feature matrix. `n_clusters` is an int or 'auto' for a silhouette-based search;
+    `method` is 'kmeans', 'minibatch' or 'auto'. Returns the fitted estimator.
+    """
+    n_samples = vectors.shape[0]
+    method = resolve_method(method, n_samples)
+    if n_clusters == 'auto':
+        n_clusters, scores = select_cluster_count(vectors, method, n_jobs=n_jobs, sample_size=sample_size)
+        if scores:
+            print(f"Selected {n_clusters} clusters ({method}) from silhouette scores: "
+                  + ', '.join(f"k={k}: {score:.3f}" for k, score in scores))
+    n_clusters = min(n_samples, int(n_clusters))
+    return make_estimator(method, n_clusters).fit(vectors)
@@ -0,0 +1,89 @@
+import os
+import pandas as pd
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+# String columns stored dictionary-encoded: entities and relationships repeat heavily
+DICTIONARY_COLUMNS = ('Domain name', 'Domain', 'Entity A', 'Relationship', 'Entity B')
+
+def domain_column(df):
+    """Name of the domain column of a domain table ('Domain', or 'Domain name' as written by domain.py)."""
+    return 'Domain' if 'Domain' in df.columns else 'Domain name'
+
+def table_format(path):
+    """'parquet', 'arrow' or 'csv' depending on the file extension."""
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if extension in ARROW_EXTENSIONS:
+        return 'arrow'
+    return 'csv'
+
+def is_table(path):
+    """Whether a path names a CSV, Parquet or Arrow table (as opposed to relationship text)."""
+    extension = os.path.splitext(str(path))[1].lower()
+    return extension == '.csv' or extension in PARQUET_EXTENSIONS or extension in ARROW_EXTENSIONS
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet/Arrow intermediates require pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+def to_arrow(df):
+    """Convert a frame to an Arrow table with dictionary-encoded entity and relationship columns."""
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, name in enumerate(table.column_names):
+        field_type = table.schema.field(i).type
+        if name in DICTIONARY_COLUMNS and (pa.types.is_string(field_type) or pa.types.is_large_string(field_type)):
+            table = table.set_column(i, name, table.column(i).dictionary_encode())
+    return table
+
+def write_table(df, path):
+    """Write a frame as CSV, Parquet or Arrow IPC depending on the extension."""
+    path = str(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    df = pd.DataFrame(df)
+    file_format = table_format(path)
+    if file_format == 'csv':
+        df.to_csv(path, index=False)
+        return path
+
+    pa = _pyarrow()
+    table = to_arrow(df)
+    if file_format == 'parquet':
+        pa.parquet.write_table(table, path)
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+def read_arrow(path, columns=None):
+    """Read a Parquet or Arrow IPC file as an Arrow table using memory-mapped I/O."""
+    pa = _pyarrow()
+    path = str(path)
+    if table_format(path) == 'parquet':
+        return pa.parquet.read_table(path, columns=columns, memory_map=True)
+    # Arrow IPC files are read zero-copy straight from the mapped file
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.select(columns) if columns else table
+
+def read_table(path, columns=None, categorical=False):
+    """
+    Read a CSV, Parquet or Arrow IPC file into a DataFrame.
+    Dictionary-encoded columns are decoded to plain strings unless categorical=True.
+    """
+    if table_format(path) == 'csv':
+        return pd.read_csv(path, usecols=columns)
+
+    df = read_arrow(path, columns).to_pandas()
+    if not categorical:
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(object)
+    return df
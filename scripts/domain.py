@@ -1,12 +1,22 @@
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
 from collections import Counter, defaultdict
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
+import argparse
 import os
 import re
 
+import instrumentation
+from clustering import fit_clusters
+from columnar_store import read_table, write_table
+from triple_store import TripleStore
+from workflow_shards import workflow_shards, map_shards
+
+SIMILARITY_THRESHOLD = 0.3    # Minimum cosine similarity for two domains to be merged
+SIMILARITY_BLOCK_SIZE = 1024  # Domains per row block in the similarity computation
+
 def extract_business_context(entity_a, relationship, entity_b):
     """
     Extract business context from entity-relationship triple.
@@ -31,30 +41,84 @@ def extract_business_context(entity_a, relationship, entity_b):
         'full_context': f"{entity_a} {relationship} {entity_b}"
     }
 
-def cluster_by_business_domain(contexts):
+def extract_business_contexts(data):
     """
-    Cluster contexts based on business domain similarity.
+    Columnar version of extract_business_context for a whole triple table.
+    Returns a DataFrame with main_object, related_terms and full_context columns.
+    String work is done once per distinct entity, (relationship, actor) pair and triple
+    of a TripleStore, and rows share the resulting string objects.
     """
-    # Create feature vectors focusing on business objects
-    vectorizer = TfidfVectorizer(
+    store = TripleStore.from_frame(data)
+    n_entities = len(store.entities)
+    entities = pd.Series(store.entities.array())
+    relationships = pd.Series(store.relationships.array())
+
+    # Normalise entity A to lower-case words separated by single spaces
+    lower_entities = entities.str.lower()
+    actor_terms = lower_entities.str.split().str.join(' ')
+    relationship_terms = relationships.str.lower()
+
+    # Related terms depend only on the (relationship, entity A) pair
+    pair_keys, pair_rows = np.unique(store.relationship.astype(np.int64) * n_entities + store.source,
+                                     return_inverse=True)
+    pair_relationships = relationship_terms.to_numpy()[pair_keys // n_entities]
+    pair_actors = actor_terms.to_numpy()[pair_keys % n_entities]
+    related_terms = pd.Series(pair_relationships).where(
+        pair_actors == '',
+        pd.Series(pair_relationships) + ' ' + pd.Series(pair_actors)
+    ).to_numpy()
+
+    # Full contexts are built once per distinct triple
+    _, first, triple_rows = np.unique(store.keys(), return_index=True, return_inverse=True)
+    full_context = (entities.to_numpy()[store.source[first]] + ' '
+                    + relationships.to_numpy()[store.relationship[first]] + ' '
+                    + entities.to_numpy()[store.target[first]])
+
+    return pd.DataFrame({
+        'main_object': lower_entities.to_numpy()[store.target],
+        'related_terms': related_terms[pair_rows.reshape(-1)],
+        'full_context': full_context[triple_rows.reshape(-1)]
+    }, index=data.index)
+
+def make_feature_vectorizer():
+    """TF-IDF vectorizer for business context features."""
+    return TfidfVectorizer(
         stop_words='english',
         ngram_range=(1, 3),  # Allow longer phrases for better context
         max_features=1000
     )
+
+def build_feature_texts(contexts):
+    """Combine main objects and related terms with emphasis on the main object."""
+    contexts = pd.DataFrame(contexts)
+    return (
+        contexts['main_object'] + ' ' + contexts['main_object'] + ' ' + contexts['related_terms']
+    ).tolist()
+
+def fit_domain_clusters(contexts, n_clusters='auto', method='auto', n_jobs=None):
+    """
+    Vectorize contexts and cluster them. Returns the fitted vectorizer and clustering model.
+    """
+    # Create feature vectors focusing on business objects
+    with instrumentation.span('tfidf_fit'):
+        vectorizer = make_feature_vectorizer()
+        vectors = vectorizer.fit_transform(build_feature_texts(contexts))
+        instrumentation.annotate(rows=vectors.shape[0], features=vectors.shape[1])
     
-    # Combine main objects and related terms with emphasis on the main object
-    feature_texts = [
-        f"{ctx['main_object']} {ctx['main_object']} {ctx['related_terms']}"
-        for ctx in contexts
-    ]
-    
-    vectors = vectorizer.fit_transform(feature_texts)
-    
-    # Determine optimal number of clusters
-    # n_clusters = min(max(3, len(contexts) // 5), 8)  # Adjust range as needed
-    n_clusters = min(len(contexts), 5)  # Adjust range as needed
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    cluster_labels = kmeans.fit_predict(vectors)
+    # Cluster, choosing the number of clusters from the data unless one is given
+    with instrumentation.span('kmeans', method=method, requested_clusters=str(n_clusters)):
+        model = fit_clusters(vectors, n_clusters=n_clusters, method=method, n_jobs=n_jobs)
+        instrumentation.annotate(clusters=int(model.n_clusters))
+    return vectorizer, model
+
+def cluster_by_business_domain(contexts, n_clusters='auto', method='auto', n_jobs=None):
+    """
+    Cluster contexts based on business domain similarity.
+    `n_clusters` is a fixed count or 'auto' to choose k from the data;
+    `method` selects the clustering backend (see clustering.fit_clusters).
+    """
+    _, model = fit_domain_clusters(contexts, n_clusters=n_clusters, method=method, n_jobs=n_jobs)
+    cluster_labels = model.labels_
     
     return cluster_labels
 
@@ -63,9 +127,10 @@ def determine_domain_name(cluster_contexts):
     Determine domain name based on the most significant business objects and their context.
     """
     # Collect all main objects and their frequencies
-    main_objects = Counter()
-    for ctx in cluster_contexts:
-        main_objects.update([ctx['main_object']])
+    if isinstance(cluster_contexts, pd.DataFrame):
+        main_objects = Counter(cluster_contexts['main_object'])
+    else:
+        main_objects = Counter(ctx['main_object'] for ctx in cluster_contexts)
     
     # Get the most common business object
     if not main_objects:
@@ -96,149 +161,249 @@ def determine_domain_name(cluster_contexts):
     
     return domain_name
 
-def identify_and_name_data_domains(csv_path):
+def name_clusters(contexts, cluster_labels):
+    """Name each cluster from its contexts (groupby keeps cluster ids in ascending order)."""
+    return {
+        cluster_id: determine_domain_name(cluster_contexts)
+        for cluster_id, cluster_contexts in contexts.groupby(cluster_labels, sort=True)
+    }
+
+def build_domain_records(data, cluster_labels, domain_names):
+    """Domain records grouped by cluster, keeping row order within each cluster."""
+    domain_records = data[['Entity A', 'Relationship', 'Entity B']].copy()
+    domain_records.insert(0, 'Domain name', pd.Series(cluster_labels, index=data.index).map(domain_names))
+    order = np.argsort(cluster_labels, kind='stable')
+    return domain_records.iloc[order].reset_index(drop=True)
+
+def identify_and_name_data_domains(csv_path, **cluster_options):
     """
     Identify and name data domains using business context analysis.
+    Keyword arguments are passed to cluster_by_business_domain.
     """
-    # Load data
-    data = pd.read_csv(csv_path)
+    # Load data (CSV, Parquet or Arrow)
+    with instrumentation.span('read_table'):
+        data = read_table(csv_path)
+        instrumentation.annotate(rows=len(data))
     
     # Extract business contexts
-    contexts = []
-    for _, row in data.iterrows():
-        context = extract_business_context(
-            row['Entity A'],
-            row['Relationship'],
-            row['Entity B']
-        )
-        contexts.append(context)
+    with instrumentation.span('extract_business_contexts'):
+        contexts = extract_business_contexts(data)
     
     # Perform clustering
-    cluster_labels = cluster_by_business_domain(contexts)
+    cluster_labels = cluster_by_business_domain(contexts, **cluster_options)
     
     # Generate domain records with context-aware names
-    domain_records = []
-    for cluster_id in range(max(cluster_labels) + 1):
-        # Get contexts for this cluster
-        cluster_contexts = [
-            ctx for ctx, label in zip(contexts, cluster_labels)
-            if label == cluster_id
-        ]
-        
-        # Determine domain name
-        domain_name = determine_domain_name(cluster_contexts)
-        
-        # Add records for this domain
-        for i, label in enumerate(cluster_labels):
-            if label == cluster_id:
-                domain_records.append({
-                    "Domain name": domain_name,
-                    "Entity A": data.iloc[i]['Entity A'],
-                    "Relationship": data.iloc[i]['Relationship'],
-                    "Entity B": data.iloc[i]['Entity B']
-                })
+    with instrumentation.span('name_clusters'):
+        domain_records = build_domain_records(data, cluster_labels, name_clusters(contexts, cluster_labels))
     
     # Post-process similar domains
     return consolidate_similar_domains(domain_records)
 
-def consolidate_similar_domains(domain_records):
+def shard_cluster_counts(sizes, n_clusters='auto'):
+    """Split a fixed cluster count across shards in proportion to their size (at least one each)."""
+    if n_clusters == 'auto':
+        return ['auto'] * len(sizes)
+    total = max(sum(sizes), 1)
+    return [max(1, round(int(n_clusters) * size / total)) for size in sizes]
+
+def domain_shard(data, n_clusters='auto', method='auto', workflow=None):
+    """Cluster, name and consolidate the domains of one shard (run in a worker process)."""
+    contexts = extract_business_contexts(data)
+    try:
+        # Shards already run in parallel, so the k search stays in this process
+        cluster_labels = cluster_by_business_domain(contexts, n_clusters=n_clusters, method=method, n_jobs=1)
+    except ValueError as e:
+        # Only stop words to vectorize (e.g. a few unassigned triples): keep the shard as one domain
+        if 'empty vocabulary' not in str(e):
+            raise
+        print(f"Shard '{workflow or 'all'}' ({len(data)} triples) has no vocabulary to cluster; kept as one domain")
+        cluster_labels = np.zeros(len(data), dtype=int)
+    domain_records = build_domain_records(data, cluster_labels, name_clusters(contexts, cluster_labels))
+    return pd.DataFrame(consolidate_similar_domains(domain_records))
+
+def cross_shard_domain_names(df, threshold=SIMILARITY_THRESHOLD):
     """
-    Consolidate similar domains based on semantic similarity and activity patterns.
+    Map each domain name to the domain it is merged into across shards. Domains are visited
+    from largest to smallest; each joins the first already visited leader domain it is
+    similar to, or becomes a leader itself. Domains are only compared with leaders, so
+    unlike consolidated_domain_names there is no transitive chaining through intermediate
+    domains, and a group never drifts away from its leader.
     """
-    df = pd.DataFrame(domain_records)
-    
-    # Create vectors for domain comparison
-    vectorizer = TfidfVectorizer(
+    activities = df['Entity A'] + ' ' + df['Relationship'] + ' ' + df['Entity B']
+    domain_profiles = activities.groupby(df['Domain name'], sort=False).agg(' '.join)
+    if len(domain_profiles) < 2:
+        return {domain: domain for domain in domain_profiles.index}
+    adjacency = similar_domain_graph(make_profile_vectorizer().fit_transform(domain_profiles.tolist()),
+                                     threshold=threshold)
+
+    domains = domain_profiles.index.tolist()
+    sizes = df['Domain name'].value_counts()
+    order = sorted(range(len(domains)), key=lambda i: (-sizes[domains[i]], domains[i]))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    leader = np.full(len(domains), -1, dtype=np.int64)
+    for i in order:
+        similar = adjacency.indices[adjacency.indptr[i]:adjacency.indptr[i + 1]]
+        leaders = similar[leader[similar] == similar]
+        leader[i] = leaders[np.argmin(rank[leaders])] if len(leaders) else i
+    return {domain: domains[leader[i]] for i, domain in enumerate(domains)}
+
+def identify_data_domains_by_workflow(csv_path, knowledge, workers=None, n_clusters='auto', method='auto'):
+    """
+    Sharded identify_and_name_data_domains: the triples are split by the workflow sections
+    of the knowledge XML, and each workflow's contexts are vectorized, clustered, named and
+    consolidated in a process pool. Across shards, same-named domains merge and the rest
+    are grouped around leader domains (see cross_shard_domain_names). Shards are merged in
+    workflow name order, which keeps the result independent of worker scheduling.
+    """
+    with instrumentation.span('read_table'):
+        data = read_table(csv_path)
+        instrumentation.annotate(rows=len(data))
+
+    with instrumentation.span('workflow_shards'):
+        shards = workflow_shards(data, knowledge)
+        instrumentation.annotate(shards=len(shards))
+
+    with instrumentation.span('domain_shards'):
+        shard_data = [shard for _, shard in shards]
+        cluster_counts = shard_cluster_counts([len(shard) for shard in shard_data], n_clusters)
+        shard_records = map_shards(domain_shard, shard_data, cluster_counts, [method] * len(shards),
+                                   [workflow for workflow, _ in shards], workers=workers)
+
+    with instrumentation.span('merge_shards'):
+        df = pd.concat(shard_records, ignore_index=True) if shard_records \
+            else pd.DataFrame(columns=['Domain name', 'Entity A', 'Relationship', 'Entity B'])
+        domain_mapping = cross_shard_domain_names(df)
+        df['Domain name'] = df['Domain name'].map(domain_mapping)
+        instrumentation.annotate(rows=len(df), domains=len(domain_mapping),
+                                 merged_domains=len(set(domain_mapping.values())))
+        return df.to_dict('records')
+
+def similar_domain_graph(profile_vectors, threshold=SIMILARITY_THRESHOLD, block_size=SIMILARITY_BLOCK_SIZE):
+    """
+    Sparse adjacency matrix of domain pairs whose cosine similarity exceeds the threshold.
+    Similarities are computed one row block at a time and thresholded immediately,
+    so the dense domains x domains matrix is never materialised.
+    """
+    n_domains = profile_vectors.shape[0]
+    profile_vectors = sp.csr_matrix(profile_vectors)
+    rows, cols = [], []
+    for start in range(0, n_domains, block_size):
+        block = (profile_vectors[start:start + block_size] @ profile_vectors.T).tocoo()
+        keep = block.data > threshold
+        rows.append(block.row[keep] + start)
+        cols.append(block.col[keep])
+    rows = np.concatenate(rows) if rows else np.array([], dtype=int)
+    cols = np.concatenate(cols) if cols else np.array([], dtype=int)
+    data = np.ones(len(rows), dtype=np.int8)
+    return sp.csr_matrix((data, (rows, cols)), shape=(n_domains, n_domains))
+
+def make_profile_vectorizer():
+    """TF-IDF vectorizer used to compare domain profiles."""
+    return TfidfVectorizer(
         ngram_range=(1, 3),
         max_features=1000
     )
-    
-    # For each domain, combine all activities to create a domain profile
-    domain_profiles = {}
-    for domain in df['Domain name'].unique():
-        domain_activities = df[df['Domain name'] == domain]
-        profile_text = ' '.join([
-            f"{row['Entity A']} {row['Relationship']} {row['Entity B']}"
-            for _, row in domain_activities.iterrows()
-        ])
-        domain_profiles[domain] = profile_text
+
+def consolidated_domain_names(df):
+    """
+    Map each domain name in a domain record frame to its consolidated name.
+    """
+    # For each domain, combine all activities to create a domain profile (one groupby pass,
+    # domains in order of first appearance)
+    activities = df['Entity A'] + ' ' + df['Relationship'] + ' ' + df['Entity B']
+    domain_profiles = activities.groupby(df['Domain name'], sort=False).agg(' '.join)
     
     # Convert profiles to vectors
-    profile_texts = list(domain_profiles.values())
-    profile_vectors = vectorizer.fit_transform(profile_texts)
-    
-    # Calculate similarity matrix
-    similarity_matrix = (profile_vectors * profile_vectors.T).toarray()
-    
-    # Group similar domains
-    domain_groups = []
-    processed_domains = set()
-    domains = list(domain_profiles.keys())
-    
-    for i, domain in enumerate(domains):
-        if domain in processed_domains:
-            continue
-            
-        # Find similar domains
-        similar_domains = []
-        for j, other_domain in enumerate(domains):
-            if i != j and other_domain not in processed_domains:
-                if similarity_matrix[i, j] > 0.3:  # Adjust threshold as needed
-                    similar_domains.append(other_domain)
-        
-        if similar_domains:
-            # Create a group including the current domain
-            group = [domain] + similar_domains
-            domain_groups.append(group)
-            processed_domains.update(group)
-        else:
-            # Domain stays separate
-            domain_groups.append([domain])
-            processed_domains.add(domain)
+    profile_vectors = make_profile_vectorizer().fit_transform(domain_profiles.tolist())
+    
+    # Group similar domains: connected components of the thresholded similarity graph
+    domains = domain_profiles.index
+    adjacency = similar_domain_graph(profile_vectors)
+    _, group_labels = connected_components(adjacency, directed=False)
+    group_of = pd.Series(group_labels, index=domains)
+    group_sizes = group_of.value_counts()
+    
+    # Most common Entity B per group; ties resolve to the alphabetically first entity,
+    # as with Series.mode()
+    row_groups = df['Domain name'].map(group_of)
+    entity_counts = df.groupby([row_groups.rename('group'), df['Entity B']]).size()
+    common_entity_b = entity_counts.groupby(level='group').idxmax().map(lambda key: key[1])
     
     # Create new consolidated domain names based on common elements
     domain_mapping = {}
-    for group in domain_groups:
-        if len(group) == 1:
+    for domain, group in group_of.items():
+        if group_sizes[group] == 1:
             # Single domain remains unchanged
-            domain_mapping[group[0]] = group[0]
+            domain_mapping[domain] = domain
         else:
-            # Analyze activities in the group to determine common focus
-            group_activities = df[df['Domain name'].isin(group)]
-            
-            # Get most common Entity B as it often indicates the domain focus
-            common_entity_b = group_activities['Entity B'].mode().iloc[0]
-            
             # Clean up the domain name
-            domain_name = common_entity_b.strip()
+            domain_name = common_entity_b[group].strip()
             if 'Management' not in domain_name:
                 domain_name += ' Management'
-            
-            # Map all domains in group to new name
-            for domain in group:
-                domain_mapping[domain] = domain_name
-    
-    # Apply mapping
-    df['Domain name'] = df['Domain name'].map(domain_mapping)
+            domain_mapping[domain] = domain_name
     
-    return df.to_dict('records')
+    return domain_mapping
+
+def consolidate_similar_domains(domain_records):
+    """
+    Consolidate similar domains based on semantic similarity and activity patterns.
+    """
+    with instrumentation.span('consolidate_similar_domains'):
+        df = pd.DataFrame(domain_records)
+        domain_mapping = consolidated_domain_names(df)
+        
+        # Apply mapping
+        df['Domain name'] = df['Domain name'].map(domain_mapping)
+        instrumentation.annotate(rows=len(df), domains=len(domain_mapping),
+                                 consolidated_domains=len(set(domain_mapping.values())))
+        
+        return df.to_dict('records')
 
 def save_domains_to_csv(domain_records, output_csv_path):
     """
-    Save domain records to CSV file.
+    Save domain records to CSV file (or Parquet/Arrow, following the file extension).
     """
     domain_df = pd.DataFrame(domain_records)
-    domain_df.to_csv(output_csv_path, index=False)
+    write_table(domain_df, output_csv_path)
     print(f"Data domains have been saved to {output_csv_path}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Identify and name data domains from entity relationships.")
+    parser.add_argument('--input', default='../results/entity_relationship/merged_knowledge.csv')
+    parser.add_argument('--output-dir', default='../results/datamesh')
+    parser.add_argument('--clusters', default='auto',
+                        help="Number of clusters, or 'auto' to select k by sampled silhouette score")
+    parser.add_argument('--method', default='auto', choices=['auto', 'kmeans', 'minibatch'],
+                        help="Clustering backend; 'auto' uses MiniBatchKMeans for large inputs")
+    parser.add_argument('--jobs', type=int, default=None, help="Processes used for the k search")
+    parser.add_argument('--workflows', default=None, metavar='KNOWLEDGE_XML',
+                        help="Cluster each workflow section of this knowledge XML separately in parallel, "
+                             "then consolidate the domains across workflows")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processes used by --workflows (default: one per CPU)")
+    parser.add_argument('--format', default='csv', choices=['csv', 'parquet', 'arrow'],
+                        help="Format of the domains output")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
 def main():
-    csv_path = '../results/entity_relationship/merged_knowledge.csv'
-    output_dir = '../results/datamesh'
+    args = parse_args()
+    instrumentation.start_from_args(args, 'domains')
+    csv_path = args.input
+    output_dir = args.output_dir
     os.makedirs(output_dir, exist_ok=True)
     
-    domain_records = identify_and_name_data_domains(csv_path)
-    output_csv_path = os.path.join(output_dir, 'domains.csv')
-    save_domains_to_csv(domain_records, output_csv_path)
+    n_clusters = args.clusters if args.clusters == 'auto' else int(args.clusters)
+    if args.workflows:
+        domain_records = identify_data_domains_by_workflow(csv_path, args.workflows, workers=args.workers,
+                                                           n_clusters=n_clusters, method=args.method)
+    else:
+        domain_records = identify_and_name_data_domains(csv_path, n_clusters=n_clusters,
+                                                        method=args.method, n_jobs=args.jobs)
+    output_csv_path = os.path.join(output_dir, f'domains.{args.format}')
+    with instrumentation.span('save_domains'):
+        save_domains_to_csv(domain_records, output_csv_path)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,269 @@
+import argparse
+import bisect
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from columnar_store import read_table, domain_column
+from triple_store import TripleStore
+
+DOMAINS_CSV = '../results/datamesh/domains.csv'
+INDEX_PATH = '../results/datamesh/domain_graph.npz'
+SEPARATOR = '\x00'  # Joins the domain and entity names stored in the index file
+
+def build_entity_domain_index(store, domain_codes):
+    """
+    Inverted entity -> domains index as the unique (domain id, entity id) pairs,
+    built from both entity columns of the triple store without iterating over rows.
+    """
+    domain_ids = np.concatenate([domain_codes, domain_codes]).astype(np.int64)
+    entity_ids = np.concatenate([store.source, store.target]).astype(np.int64)
+    pairs = np.unique(domain_ids * len(store.entities) + entity_ids)
+    return pairs // len(store.entities), pairs % len(store.entities)
+
+def shared_entity_pairs(domain_ids, entity_ids, n_entities):
+    """
+    (first domain, second domain, entity) arrays for every entity shared by two domains,
+    sorted by domain pair and then entity id. Only entities present in several domains
+    are joined, so the work is proportional to the actual overlaps rather than to all
+    domain pairs.
+    """
+    # Keep entities that appear in more than one domain
+    shared = np.bincount(entity_ids, minlength=n_entities)[entity_ids] > 1
+    shared = pd.DataFrame({'Domain': domain_ids[shared], 'Entity': entity_ids[shared]})
+    pairs = shared.merge(shared, on='Entity', suffixes=('_1', '_2'))
+    pairs = pairs[pairs['Domain_1'] < pairs['Domain_2']]
+    first, second, entity = (pairs[column].to_numpy() for column in ('Domain_1', 'Domain_2', 'Entity'))
+    order = np.lexsort((entity, second, first))
+    return first[order], second[order], entity[order]
+
+def pack_strings(strings):
+    """Strings as one UTF-8 byte array, for storing in the .npz file."""
+    return np.frombuffer(SEPARATOR.join(map(str, strings)).encode('utf-8'), dtype=np.uint8)
+
+def unpack_strings(packed, count):
+    if count == 0:
+        return []
+    return packed.tobytes().decode('utf-8').split(SEPARATOR)
+
+class DomainGraphIndex:
+    """
+    The domain-entity graph as CSR indexes: entities of each domain, domains of each entity,
+    and the weighted domain adjacency (weight = number of shared entities), plus precomputed
+    connected components. Entities are numbered in sorted order, so every entity list comes
+    out sorted and entity names are found by binary search.
+    """
+
+    def __init__(self, domains, entities, domain_entities, entity_domains, adjacency, components):
+        self.domains = domains
+        self.entities = entities
+        self.domain_entities = domain_entities
+        self.entity_domains = entity_domains
+        self.adjacency = adjacency
+        self.components = components
+        self._domain_ids = None
+
+    @classmethod
+    def from_membership(cls, domains, entities, domain_ids, entity_ids):
+        """Build the index from (domain id, entity id) membership pairs."""
+        # Renumber entities in sorted order
+        order = sorted(range(len(entities)), key=entities.__getitem__)
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order))
+        entities = [entities[i] for i in order]
+        entity_ids = ranks[entity_ids]
+
+        membership = sp.csr_matrix((np.ones(len(domain_ids), dtype=np.int32), (domain_ids, entity_ids)),
+                                   shape=(len(domains), len(entities)))
+        membership.sort_indices()
+        entity_domains = membership.T.tocsr()
+        entity_domains.sort_indices()
+
+        # Shared entity counts between domains, without the diagonal
+        adjacency = (membership @ membership.T).tocsr()
+        adjacency.setdiag(0)
+        adjacency.eliminate_zeros()
+        adjacency.sort_indices()
+        _, components = connected_components(adjacency, directed=False)
+        return cls(list(domains), entities, membership, entity_domains, adjacency, components.astype(np.int32))
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build the index from a domain table with Entity A/Relationship/Entity B columns."""
+        store = TripleStore.from_frame(df)
+        # Domains are numbered in order of first appearance
+        domain_codes, domains = pd.factorize(df[domain_column(df)], use_na_sentinel=False)
+        domain_ids, entity_ids = build_entity_domain_index(store, domain_codes)
+        return cls.from_membership(list(domains), store.entities.strings, domain_ids, entity_ids)
+
+    @classmethod
+    def from_table(cls, path):
+        return cls.from_frame(read_table(path))
+
+    def save(self, path):
+        """Write the index as a single uncompressed .npz file."""
+        os.makedirs(os.path.dirname(str(path)) or '.', exist_ok=True)
+        np.savez(
+            path,
+            domains=pack_strings(self.domains), n_domains=len(self.domains),
+            entities=pack_strings(self.entities), n_entities=len(self.entities),
+            membership_indptr=self.domain_entities.indptr, membership_indices=self.domain_entities.indices,
+            entity_indptr=self.entity_domains.indptr, entity_indices=self.entity_domains.indices,
+            adjacency_indptr=self.adjacency.indptr, adjacency_indices=self.adjacency.indices,
+            adjacency_weights=self.adjacency.data, components=self.components
+        )
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            n_domains, n_entities = int(data['n_domains']), int(data['n_entities'])
+            ones = lambda n: np.ones(n, dtype=np.int32)
+            domain_entities = sp.csr_matrix(
+                (ones(len(data['membership_indices'])), data['membership_indices'], data['membership_indptr']),
+                shape=(n_domains, n_entities))
+            entity_domains = sp.csr_matrix(
+                (ones(len(data['entity_indices'])), data['entity_indices'], data['entity_indptr']),
+                shape=(n_entities, n_domains))
+            adjacency = sp.csr_matrix(
+                (data['adjacency_weights'], data['adjacency_indices'], data['adjacency_indptr']),
+                shape=(n_domains, n_domains))
+            return cls(unpack_strings(data['domains'], n_domains), unpack_strings(data['entities'], n_entities),
+                       domain_entities, entity_domains, adjacency, data['components'])
+
+    def domain_id(self, domain):
+        if self._domain_ids is None:
+            self._domain_ids = {name: i for i, name in enumerate(self.domains)}
+        if domain not in self._domain_ids:
+            raise KeyError(f"Unknown domain: {domain}")
+        return self._domain_ids[domain]
+
+    def entity_id(self, entity):
+        i = bisect.bisect_left(self.entities, entity)
+        if i == len(self.entities) or self.entities[i] != entity:
+            raise KeyError(f"Unknown entity: {entity}")
+        return i
+
+    @staticmethod
+    def _row(matrix, i):
+        return matrix.indices[matrix.indptr[i]:matrix.indptr[i + 1]]
+
+    def entities_of(self, domain):
+        """Sorted entities of a domain."""
+        return [self.entities[i] for i in self._row(self.domain_entities, self.domain_id(domain))]
+
+    def domains_of(self, entity):
+        """Domains that contain an entity."""
+        return [self.domains[i] for i in self._row(self.entity_domains, self.entity_id(entity))]
+
+    def neighbours(self, domain):
+        """(domain, shared entity count) of every adjacent domain, most shared first."""
+        i = self.domain_id(domain)
+        start, end = self.adjacency.indptr[i], self.adjacency.indptr[i + 1]
+        pairs = zip(self.adjacency.indices[start:end].tolist(), self.adjacency.data[start:end].tolist())
+        return [(self.domains[j], weight) for j, weight in sorted(pairs, key=lambda pair: (-pair[1], pair[0]))]
+
+    def shared_entities(self, domain_a, domain_b):
+        """Sorted entities present in both domains."""
+        shared = np.intersect1d(self._row(self.domain_entities, self.domain_id(domain_a)),
+                                self._row(self.domain_entities, self.domain_id(domain_b)), assume_unique=True)
+        return [self.entities[i] for i in shared]
+
+    def k_hop(self, domain, k=1):
+        """Domains reachable within k hops, mapped to their hop distance (breadth-first over the CSR)."""
+        start = self.domain_id(domain)
+        distance = np.full(len(self.domains), -1, dtype=np.int32)
+        distance[start] = 0
+        frontier = np.array([start])
+        for hop in range(1, k + 1):
+            if not len(frontier):
+                break
+            reached = self.adjacency[frontier].indices
+            reached = np.unique(reached[distance[reached] < 0])
+            distance[reached] = hop
+            frontier = reached
+        found = np.flatnonzero(distance > 0)
+        return {self.domains[i]: int(distance[i]) for i in found[np.argsort(distance[found], kind='stable')]}
+
+    def component(self, domain):
+        """Domains in the same connected component as a domain."""
+        label = self.components[self.domain_id(domain)]
+        return [self.domains[i] for i in np.flatnonzero(self.components == label)]
+
+    def component_list(self):
+        """All connected components, largest first."""
+        order = np.argsort(self.components, kind='stable')
+        labels = self.components[order]
+        groups = np.split(order, np.flatnonzero(labels[1:] != labels[:-1]) + 1) if len(order) else []
+        return sorted(([self.domains[i] for i in group] for group in groups), key=len, reverse=True)
+
+    def edges(self):
+        """(domain, domain, sorted shared entities) for every adjacent pair, in domain order."""
+        membership = self.domain_entities.tocoo()
+        first, second, entity = shared_entity_pairs(membership.row, membership.col, len(self.entities))
+        boundaries = np.flatnonzero((first[1:] != first[:-1]) | (second[1:] != second[:-1])) + 1
+        for group in np.split(np.arange(len(first)), boundaries) if len(first) else []:
+            yield (self.domains[first[group[0]]], self.domains[second[group[0]]],
+                   [self.entities[i] for i in entity[group]])
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build and query the persisted domain graph index.")
+    parser.add_argument('--index', default=INDEX_PATH, help="Index file (.npz)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Build the index from a domain table")
+    build_parser.add_argument('--input', default=DOMAINS_CSV)
+
+    subparsers.add_parser('neighbours', help="Adjacent domains with shared entity counts").add_argument('domain')
+    shared_parser = subparsers.add_parser('shared', help="Entities shared by two domains")
+    shared_parser.add_argument('domain')
+    shared_parser.add_argument('other')
+    subparsers.add_parser('entity', help="Domains containing an entity").add_argument('entity')
+    subparsers.add_parser('entities', help="Entities of a domain").add_argument('domain')
+    khop_parser = subparsers.add_parser('khop', help="Domains reachable within k hops")
+    khop_parser.add_argument('domain')
+    khop_parser.add_argument('-k', type=int, default=2)
+    component_parser = subparsers.add_parser('components', help="Connected components")
+    component_parser.add_argument('domain', nargs='?', help="Only the component of this domain")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command == 'build':
+        index = DomainGraphIndex.from_table(args.input)
+        index.save(args.index)
+        print(f"Index of {len(index.domains)} domains, {len(index.entities)} entities and "
+              f"{index.adjacency.nnz // 2} edges saved to {args.index}")
+        return
+
+    start = time.perf_counter()
+    index = DomainGraphIndex.load(args.index)
+    loaded = time.perf_counter()
+    try:
+        if args.command == 'neighbours':
+            result = index.neighbours(args.domain)
+        elif args.command == 'shared':
+            result = index.shared_entities(args.domain, args.other)
+        elif args.command == 'entity':
+            result = index.domains_of(args.entity)
+        elif args.command == 'entities':
+            result = index.entities_of(args.domain)
+        elif args.command == 'khop':
+            result = index.k_hop(args.domain, args.k)
+        else:
+            result = index.component(args.domain) if args.domain else index.component_list()
+    except KeyError as e:
+        print(e.args[0], file=sys.stderr)
+        sys.exit(1)
+    queried = time.perf_counter()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"Loaded index in {(loaded - start) * 1000:.2f}ms, query took {(queried - loaded) * 1000:.3f}ms",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
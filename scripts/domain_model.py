@@ -0,0 +1,175 @@
+import argparse
+import os
+import joblib
+import numpy as np
+import pandas as pd
+
+from columnar_store import read_table
+from domain import (
+    extract_business_contexts,
+    build_feature_texts,
+    fit_domain_clusters,
+    name_clusters,
+    build_domain_records,
+    consolidated_domain_names,
+    save_domains_to_csv
+)
+
+MODEL_PATH = '../results/datamesh/domain_model.joblib'
+DOMAINS_CSV = '../results/datamesh/domains.csv'
+OUTLIER_PERCENTILE = 95  # Training distance percentile beyond which a row counts as an outlier
+DRIFT_THRESHOLD = 0.2    # Share of outlier rows that triggers a full recluster
+TRIPLE_COLUMNS = ['Entity A', 'Relationship', 'Entity B']
+
+class DomainModel:
+    """
+    Persisted domain discovery state: the fitted feature vectorizer, the clustering model
+    (centroids) and the final domain name of every cluster. New triples are assigned to
+    the nearest centroid without refitting, so domain names stay stable between runs.
+    """
+
+    def __init__(self, vectorizer, clusterer, cluster_names, outlier_distance):
+        self.vectorizer = vectorizer
+        self.clusterer = clusterer
+        self.cluster_names = cluster_names
+        self.outlier_distance = outlier_distance
+
+    @classmethod
+    def fit(cls, data, **cluster_options):
+        """Fit a model on a triple table and return it with the consolidated domain records."""
+        contexts = extract_business_contexts(data)
+        vectorizer, clusterer = fit_domain_clusters(contexts, **cluster_options)
+        cluster_labels = clusterer.labels_
+
+        initial_names = name_clusters(contexts, cluster_labels)
+        domain_records = build_domain_records(data, cluster_labels, initial_names)
+        domain_mapping = consolidated_domain_names(domain_records)
+        domain_records['Domain name'] = domain_records['Domain name'].map(domain_mapping)
+
+        # Final (consolidated) name of each cluster
+        cluster_names = [
+            domain_mapping.get(initial_names.get(cluster_id), 'General Domain')
+            for cluster_id in range(clusterer.n_clusters)
+        ]
+
+        vectors = vectorizer.transform(build_feature_texts(contexts))
+        distances = clusterer.transform(vectors).min(axis=1)
+        outlier_distance = float(np.percentile(distances, OUTLIER_PERCENTILE)) if len(distances) else 0.0
+
+        return cls(vectorizer, clusterer, cluster_names, outlier_distance), domain_records
+
+    def assign(self, data):
+        """
+        Assign new Entity A/Relationship/Entity B rows to existing domains.
+        Returns the domain records and the share of rows that look like drift
+        (far from every centroid or without any known vocabulary).
+        """
+        contexts = extract_business_contexts(data)
+        vectors = self.vectorizer.transform(build_feature_texts(contexts))
+        distances = self.clusterer.transform(vectors)
+        nearest = distances.argmin(axis=1)
+
+        outliers = (distances.min(axis=1) > self.outlier_distance) | (vectors.getnnz(axis=1) == 0)
+        drift = float(outliers.mean()) if len(outliers) else 0.0
+
+        domain_records = data[['Entity A', 'Relationship', 'Entity B']].copy()
+        domain_records.insert(0, 'Domain name', np.asarray(self.cluster_names, dtype=object)[nearest])
+        return domain_records.reset_index(drop=True), drift
+
+    def save(self, path):
+        """
+        Persist the fitted parts with joblib. They are stored as a plain dict rather than the
+        DomainModel itself, so the file does not depend on the module the model was fitted from
+        (running this file as a script would otherwise pickle the class as __main__.DomainModel).
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump({
+            'vectorizer': self.vectorizer,
+            'clusterer': self.clusterer,
+            'cluster_names': self.cluster_names,
+            'outlier_distance': self.outlier_distance
+        }, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a model saved with save()."""
+        return cls(**joblib.load(path))
+
+def new_triples(rows, existing):
+    """Rows whose triple is neither repeated within them nor already in the existing table."""
+    rows = rows.drop_duplicates(TRIPLE_COLUMNS)
+    if existing is None:
+        return rows
+    known = pd.MultiIndex.from_frame(existing[TRIPLE_COLUMNS].astype(str))
+    return rows[~pd.MultiIndex.from_frame(rows[TRIPLE_COLUMNS].astype(str)).isin(known)]
+
+def fit_command(args):
+    data = read_table(args.input)
+    model, domain_records = DomainModel.fit(data, n_clusters=args.clusters, method=args.method)
+    model.save(args.model)
+    print(f"Domain model with {len(model.cluster_names)} clusters saved to {args.model}")
+    save_domains_to_csv(domain_records, args.domains)
+
+def assign_command(args):
+    model = DomainModel.load(args.model)
+    existing = read_table(args.domains) if os.path.exists(args.domains) else None
+    # Known triples keep their current domain: only the new ones are assigned and count towards drift
+    new_data = read_table(args.input)
+    skipped = len(new_data)
+    new_data = new_triples(new_data, existing)
+    skipped -= len(new_data)
+    if skipped:
+        print(f"Skipped {skipped} triples already in {args.domains}")
+    if not len(new_data):
+        print(f"No new triples to assign; {args.domains} left unchanged")
+        return
+
+    domain_records, drift = model.assign(new_data)
+    print(f"Assigned {len(domain_records)} rows; drift {drift:.1%} (threshold {args.drift_threshold:.1%})")
+
+    if drift > args.drift_threshold and args.recluster:
+        # Too many rows do not fit the current domains: refit on all known triples
+        print("Drift threshold exceeded, reclustering all triples")
+        triples = pd.concat(
+            [existing[TRIPLE_COLUMNS], new_data] if existing is not None else [new_data],
+            ignore_index=True
+        ).drop_duplicates(TRIPLE_COLUMNS, ignore_index=True)
+        model, domain_records = DomainModel.fit(triples, n_clusters=args.clusters, method=args.method)
+        model.save(args.model)
+        save_domains_to_csv(domain_records, args.domains)
+        return
+    if drift > args.drift_threshold:
+        print("Drift threshold exceeded; rerun with --recluster to refit the domains")
+
+    if existing is not None:
+        domain_records = pd.concat([existing, domain_records], ignore_index=True)
+    save_domains_to_csv(domain_records, args.domains)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Persisted domain model for online domain assignment.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    fit_parser = subparsers.add_parser('fit', help="Fit the domain model on all triples")
+    fit_parser.add_argument('--input', default='../results/entity_relationship/merged_knowledge.csv')
+    fit_parser.set_defaults(func=fit_command)
+
+    assign_parser = subparsers.add_parser('assign', help="Assign new triples to existing domains")
+    assign_parser.add_argument('input', help="CSV with Entity A, Relationship and Entity B columns")
+    assign_parser.add_argument('--drift-threshold', type=float, default=DRIFT_THRESHOLD)
+    assign_parser.add_argument('--recluster', action='store_true',
+                               help="Refit all domains when the drift threshold is exceeded")
+    assign_parser.set_defaults(func=assign_command)
+
+    for sub in (fit_parser, assign_parser):
+        sub.add_argument('--model', default=MODEL_PATH)
+        sub.add_argument('--domains', default=DOMAINS_CSV)
+        sub.add_argument('--clusters', default='auto', type=lambda v: v if v == 'auto' else int(v))
+        sub.add_argument('--method', default='auto', choices=['auto', 'kmeans', 'minibatch'])
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
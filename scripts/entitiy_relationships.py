@@ -1,54 +1,348 @@
-import xml.etree.ElementTree as ET
+import argparse
+import asyncio
+import functools
+import json
+import os
+import random
+import time
+from collections import Counter
 import openai
 
-# Load XML File
-xml_file_path = '../data/knowledge/merged.xml'  # Update with your actual file path
-tree = ET.parse(xml_file_path)
-root = tree.getroot()
-
-# Extract Entities, Keywords, and Data Owners
-data = []
-for source in root.findall('source'):
-    source_name = source.find('stable_attributes/Source_Name').text
-    data_owner = source.find('stable_attributes/Data_Owner').text
-    keywords = source.find('stable_attributes/Keywords').text.split(', ')
-    
-    data.append({
-        'Source_Name': source_name,
-        'Data_Owner': data_owner,
-        'Keywords': keywords
-    })
+import instrumentation
+from knowledge_loader import iter_sources, SourceMatcher
+from llm_cache import ResponseCache, make_cache_key, CACHE_DIR, MAX_CACHE_BYTES, MAX_AGE_DAYS
+from relationship_parser import parse_line, parse_lines, write_triples, RELATIONSHIPS_CSV
 
-# ChatGPT-based Relationship Generator
-def generate_relationships_with_chatgpt(data):
-    prompt = (
-        "You are an intelligent assistant tasked with mapping keywords to meaningful relationships. "
-        "Given a data owner and associated keywords, generate relationships in the format: "
-        "'Entity A --Relationship--> Entity B', where 'Entity A' is the data owner and 'Entity B' is the keyword. "
-        "Use meaningful verbs for the relationships based on the context of the keyword.\n\n"
+# Default paths and model settings
+XML_FILE_PATH = '../data/knowledge/merged.xml'  # Update with your actual file path
+OUTPUT_FILE = "../results/entity_relationship/merged_knowledge.txt"
+MODEL = "gpt-4"
+
+# Batching and concurrency defaults
+MAX_BATCH_TOKENS = 2000   # Token budget for the source part of a single prompt
+MAX_IN_FLIGHT = 4         # Concurrent requests sent to the LLM
+MAX_RETRIES = 5
+BASE_DELAY = 1.0          # Seconds, doubled on every retry
+
+PROMPT_HEADER = (
+    "You are an intelligent assistant tasked with mapping keywords to meaningful relationships. "
+    "Given a data owner and associated keywords, generate relationships in the format: "
+    "'Entity A --Relationship--> Entity B', where 'Entity A' is the data owner and 'Entity B' is the keyword. "
+    "Use meaningful verbs for the relationships based on the context of the keyword.\n\n"
+)
+
+def load_sources(xml_paths):
+    """Load source records from a knowledge XML file, glob pattern or list of shards."""
+    with instrumentation.span('load_sources'):
+        data = list(iter_sources(xml_paths))
+        instrumentation.annotate(rows=len(data))
+    return data
+
+def format_record(record):
+    """Format a single source record as it appears in the prompt."""
+    return (
+        f"Data Owner: {record['Data_Owner']}\n"
+        f"Keywords: {', '.join(record['Keywords'])}\n\n"
     )
-    for record in data:
-        prompt += f"Data Owner: {record['Data_Owner']}\n"
-        prompt += f"Keywords: {', '.join(record['Keywords'])}\n\n"
 
-    # Use ChatGPT API to generate relationships
-    openai.api_key = ''  # Replace with your OpenAI API key
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+def batch_sources(data, max_tokens=MAX_BATCH_TOKENS):
+    """
+    Split source records into batches whose prompt stays within the token budget.
+    Items may be records or (index, record) pairs. A record that exceeds the budget
+    on its own is sent as a single-record batch.
+    """
+    batch = []
+    batch_tokens = 0
+    for item in data:
+        record = item[1] if isinstance(item, tuple) else item
+        record_tokens = estimate_tokens(format_record(record))
+        if batch and batch_tokens + record_tokens > max_tokens:
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(item)
+        batch_tokens += record_tokens
+    if batch:
+        yield batch
+
+def build_prompt(batch):
+    """Build the relationship extraction prompt for a batch of source records."""
+    return PROMPT_HEADER + ''.join(format_record(record) for record in batch)
+
+async def openai_complete(prompt, model=MODEL):
+    """Send a prompt to the OpenAI chat API and return the message content."""
+    response = await openai.ChatCompletion.acreate(
+        model=model,
         messages=[{"role": "user", "content": prompt}]
     )
-    relationships = response['choices'][0]['message']['content']
-    return relationships
+    usage = response.get('usage') or {}
+    instrumentation.count('llm.prompt_tokens', usage.get('prompt_tokens', 0))
+    instrumentation.count('llm.completion_tokens', usage.get('completion_tokens', 0))
+    return response['choices'][0]['message']['content']
+
+def is_retryable(error):
+    """Check whether an LLM call failed because of rate limiting or a transient server error."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, 'http_status', None) or getattr(error, 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return 'RateLimit' in type(error).__name__
+
+def retry_after(error):
+    """Return the server-suggested delay in seconds from a rate-limit error, if any."""
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after') or headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+async def complete_with_retry(complete, prompt, max_retries=MAX_RETRIES, base_delay=BASE_DELAY):
+    """Call the LLM, retrying rate-limited or transient failures with exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            return await complete(prompt)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = retry_after(e)
+            if delay is None:
+                # Exponential backoff with jitter so concurrent batches do not retry in lockstep
+                delay = base_delay * (2 ** attempt) * (1 + random.random())
+            instrumentation.count('llm.retries')
+            print(f"Retrying batch after {type(e).__name__} ({attempt + 1}/{max_retries}) in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+def attribute_relationships(batch, output):
+    """
+    Assign each relationship line of a batch response to the source record it was generated from.
+    Lines are matched on data owner and keyword, then on data owner alone; a line matching several
+    sources goes to the first of them only, so every line of the response is written once.
+    Returns the text of every record and the text of the lines that could not be attributed.
+    """
+    per_record = [[] for _ in batch]
+    unattributed = []
+    matcher = SourceMatcher(batch)
+    for line in output.splitlines():
+        parts = parse_line(line)
+        if not parts:
+            continue
+        matches, _ = matcher.match(parts[0], parts[2])
+        if matches:
+            per_record[matches[0]].append(line.strip())
+        else:
+            unattributed.append(line.strip())
+    return ['\n'.join(lines) for lines in per_record], '\n'.join(unattributed)
+
+def merge_results(results):
+    """Merge per-source outputs in source order into a single relationships text."""
+    return '\n'.join(result.strip() for result in results if result and result.strip())
+
+async def extract_source_relationships(data, complete=None, model=MODEL, cache=None,
+                                       max_in_flight=MAX_IN_FLIGHT, max_batch_tokens=MAX_BATCH_TOKENS,
+                                       max_retries=MAX_RETRIES, base_delay=BASE_DELAY):
+    """
+    Extract relationships for all source records using concurrent, token-budgeted batches.
+    Returns one relationships text per source record, in input order.
+    `complete` is any coroutine function taking a prompt and returning the model output,
+    which allows running against a fake client or a local stub server.
+    When a ResponseCache is given, only sources without a cached response are sent to the model.
+    """
+    if complete is None:
+        complete = functools.partial(openai_complete, model=model)
+
+    results = [None] * len(data)
+    keys = [None] * len(data)
+    pending = []
+    for i, record in enumerate(data):
+        if cache is not None:
+            keys[i] = make_cache_key(model, PROMPT_HEADER, record['Data_Owner'], record['Keywords'])
+            cached = cache.get(keys[i])
+            if cached is not None:
+                results[i] = cached
+                continue
+        pending.append((i, record))
+
+    batches = list(batch_sources(pending, max_batch_tokens))
+    instrumentation.count('llm.cache_hits', len(data) - len(pending))
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def run_batch(batch):
+        records = [record for _, record in batch]
+        prompt = build_prompt(records)
+        async with semaphore:
+            # Spans start once a slot is free, so they measure LLM latency rather than queueing
+            with instrumentation.span('llm.batch', sources=len(records), estimated_tokens=estimate_tokens(prompt)):
+                start = time.perf_counter()
+                output = await complete_with_retry(complete, prompt, max_retries, base_delay)
+                instrumentation.count('llm.requests')
+                instrumentation.count('llm.latency_seconds', time.perf_counter() - start)
+                instrumentation.count('llm.estimated_prompt_tokens', estimate_tokens(prompt))
+        texts, unattributed = attribute_relationships(records, output)
+        for (i, _), text in zip(batch, texts):
+            results[i] = text
+            if cache is not None:
+                cache.put(keys[i], text)
+        if unattributed:
+            # Kept with the batch's first source so nothing is lost, but not cached: which source
+            # they would be cached under depends on how the sources happened to be batched
+            first = batch[0][0]
+            results[first] = merge_results([results[first], unattributed])
+
+    print(f"Extracting relationships for {len(pending)} of {len(data)} sources in {len(batches)} batches "
+          f"({max_in_flight} in flight)")
+    await asyncio.gather(*(run_batch(batch) for batch in batches))
+    # Results are stored by source position, so they are ordered regardless of completion order
+    return results
+
+async def extract_relationships(data, **kwargs):
+    """Extract relationships for all source records and merge them into a single text."""
+    return merge_results(await extract_source_relationships(data, **kwargs))
+
+def manifest_path(output_file):
+    """Path of the incremental manifest stored next to the relationships output."""
+    return f"{os.path.splitext(output_file)[0]}.manifest.json"
+
+def load_manifest(path):
+    """Load the incremental manifest, or an empty one if it does not exist yet."""
+    if not os.path.exists(path):
+        return {'sources': []}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, path):
+    """Write the incremental manifest atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def source_ids(data):
+    """Stable identifiers for source records; repeated Source_Names get an occurrence suffix."""
+    seen = Counter()
+    ids = []
+    for record in data:
+        name = record['Source_Name']
+        ids.append(name if not seen[name] else f"{name}#{seen[name]}")
+        seen[name] += 1
+    return ids
+
+@instrumentation.traced('extract_incremental')
+async def extract_incremental(data, manifest, **kwargs):
+    """
+    Re-extract only sources that were added or whose stable_attributes changed since the manifest
+    was written. Triples of deleted sources are dropped. Returns the merged relationships text and
+    the updated manifest.
+    """
+    previous = {entry['id']: entry for entry in manifest.get('sources', [])}
+    ids = source_ids(data)
+
+    stale = [
+        i for i, (source_id, record) in enumerate(zip(ids, data))
+        if source_id not in previous or previous[source_id]['fingerprint'] != record['Fingerprint']
+    ]
+    added = sum(1 for i in stale if ids[i] not in previous)
+    deleted = len(set(previous) - set(ids))
+    instrumentation.annotate(sources=len(data), stale=len(stale))
+    print(f"Incremental update: {added} added, {len(stale) - added} changed, {deleted} deleted, "
+          f"{len(data) - len(stale)} unchanged")
+
+    extracted = await extract_source_relationships([data[i] for i in stale], **kwargs)
+    fresh = dict(zip(stale, extracted))
+
+    entries = []
+    for i, (source_id, record) in enumerate(zip(ids, data)):
+        relationships = fresh[i] if i in fresh else previous[source_id]['relationships']
+        entries.append({
+            'id': source_id,
+            'fingerprint': record['Fingerprint'],
+            'relationships': relationships
+        })
+
+    merged = merge_results([entry['relationships'] for entry in entries])
+    return merged, {'sources': entries}
+
+# ChatGPT-based Relationship Generator
+def generate_relationships_with_chatgpt(data, **kwargs):
+    """Synchronous wrapper around extract_relationships."""
+    return asyncio.run(extract_relationships(data, **kwargs))
+
+def save_relationships(relationships, output_file):
+    """Save extracted relationships to a text file."""
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, "w") as file:
+        file.write(relationships)
+    print(f"Relationships saved to {output_file}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract entity relationships from knowledge XML using an LLM.")
+    parser.add_argument('--input', default=XML_FILE_PATH, help="Knowledge XML file or glob of XML shards")
+    parser.add_argument('--output', default=OUTPUT_FILE, help="Relationships output file")
+    parser.add_argument('--triples-output', default=RELATIONSHIPS_CSV,
+                        help="Triple table for domain.py (.csv, .parquet or .arrow); empty to skip")
+    parser.add_argument('--model', default=MODEL)
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                        help="Maximum number of concurrent LLM requests")
+    parser.add_argument('--batch-tokens', type=int, default=MAX_BATCH_TOKENS,
+                        help="Token budget per prompt batch")
+    parser.add_argument('--max-retries', type=int, default=MAX_RETRIES)
+    parser.add_argument('--api-base', default=None,
+                        help="Alternative API base URL, e.g. a local stub LLM server")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only re-extract sources added or changed since the last run")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="LLM response cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="Always call the LLM")
+    parser.add_argument('--cache-max-mb', type=float, default=MAX_CACHE_BYTES / (1024 * 1024))
+    parser.add_argument('--cache-max-age-days', type=float, default=MAX_AGE_DAYS)
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    instrumentation.start_from_args(args, 'extract')
+
+    openai.api_key = os.environ.get('OPENAI_API_KEY', '')  # Set OPENAI_API_KEY in your environment
+    if args.api_base:
+        openai.api_base = args.api_base
+
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_dir,
+                              max_bytes=int(args.cache_max_mb * 1024 * 1024),
+                              max_age_days=args.cache_max_age_days)
+
+    data = load_sources(args.input)
+
+    options = dict(
+        model=args.model,
+        cache=cache,
+        max_in_flight=args.max_in_flight,
+        max_batch_tokens=args.batch_tokens,
+        max_retries=args.max_retries
+    )
 
-# Generate relationships
-relationships = generate_relationships_with_chatgpt(data)
+    # Generate relationships; a full run is an incremental run against an empty manifest,
+    # so the manifest is always written for the next incremental run
+    manifest_file = manifest_path(args.output)
+    manifest = load_manifest(manifest_file) if args.incremental else {'sources': []}
+    relationships, manifest = asyncio.run(extract_incremental(data, manifest, **options))
 
-# Save the relationships or print them
-print(relationships)
+    # Save the relationships or print them
+    print(relationships)
+    with instrumentation.span('save_outputs'):
+        save_relationships(relationships, args.output)
+        save_manifest(manifest, manifest_file)
+        if args.triples_output:
+            write_triples(parse_lines(relationships.splitlines()), args.triples_output)
+            print(f"Triples saved to {args.triples_output}")
 
-# Optional: Save relationships to a file
-output_file = "../results/entity_relationship/merged_knowledge.txt"
-with open(output_file, "w") as file:
-    file.write(relationships)
+    if cache is not None:
+        cache.evict()
+        cache.report()
 
-print(f"Relationships saved to {output_file}")
+if __name__ == "__main__":
+    main()
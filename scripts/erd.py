@@ -1,37 +1,75 @@
+import argparse
+import logging
 import os
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from columnar_store import is_table, read_table, domain_column
+from relationship_parser import COLUMNS, parse_line, parse_file
+from triple_store import TripleStore
+from workflow_shards import workflow_shards, map_shards
+
+logger = logging.getLogger("erd")
+
+MERMAID_HEADER = [
+    "graph TD",
+    "    %% Styles",
+    "    classDef default fill:#f9f9f9,stroke:#333,stroke-width:2px;",
+    ""
+]
+MAX_SHARDS = 16
+OTHER_DOMAINS = 'Other domains'  # Shared shard of the smaller domains beyond max_shards
+
+def configure_logging(verbosity=0):
+    """Quiet by default; -v reports per-stage counters and timings, -vv logs every item."""
+    level = logging.WARNING
+    if verbosity == 1:
+        level = logging.INFO
+    elif verbosity >= 2:
+        level = logging.DEBUG
+    logging.basicConfig(level=level, format="%(message)s")
+    logger.setLevel(level)
 
 def read_relationships_from_file(file_path):
-    """Read relationships from file with detailed logging."""
-    print(f"\n=== Reading File ===")
-    print(f"Attempting to read from: {os.path.abspath(file_path)}")
-    
+    """
+    Read relationships from file with detailed logging.
+    Text files are returned as a string; CSV/Parquet/Arrow triple tables as a TripleStore.
+    """
+    logger.info("=== Reading File ===")
+    logger.info("Attempting to read from: %s", os.path.abspath(file_path))
+
     try:
         if not os.path.exists(file_path):
-            print(f"ERROR: File not found: {file_path}")
+            logger.error("ERROR: File not found: %s", file_path)
             return None
-        
+
+        if is_table(file_path):
+            return TripleStore.read(file_path)
+
         with open(file_path, 'r', encoding='utf-8') as file:
             content = file.read()
-            print(f"\nFile contents ({len(content.split('\n'))} lines):")
-            print("First 5 lines:")
-            for line in content.split('\n')[:5]:
-                print(f"  {line}")
+            if logger.isEnabledFor(logging.DEBUG):
+                lines = content.split('\n')
+                logger.debug("File contents (%d lines):", len(lines))
+                logger.debug("First 5 lines:")
+                for line in lines[:5]:
+                    logger.debug("  %s", line)
             return content
-            
+
     except Exception as e:
-        print(f"ERROR reading file: {str(e)}")
+        logger.error("ERROR reading file: %s", e)
         return None
 
 def sanitize_node_text(text):
     """Sanitize node text by removing or replacing special characters."""
-    original = text
     # Remove leading '>' and any surrounding whitespace
     text = text.strip().lstrip('>')
     # Replace any remaining special characters with spaces
-    result = text.strip()
-    if original != result:
-        print(f"Sanitized: '{original}' -> '{result}'")
-    return result
+    return text.strip()
 
 def create_node_id(text):
     """Create a valid Mermaid node ID from text."""
@@ -40,137 +78,388 @@ def create_node_id(text):
     # Replace spaces and special characters with underscores
     return text.replace(' ', '_').replace('-', '_')
 
+@instrumentation.traced('create_mermaid_code')
 def create_mermaid_code(content):
-    """Convert content to Mermaid diagram code with proper formatting and logging."""
-    print("\n=== Creating Mermaid Code ===")
-    
+    """
+    Convert content to Mermaid diagram code with proper formatting and logging.
+    Content is relationship text, a TripleStore, or an iterable of (source, relationship, target) triples.
+    """
+    logger.info("=== Creating Mermaid Code ===")
+    # Checked once so the per-item debug path costs nothing when disabled
+    debug = logger.isEnabledFor(logging.DEBUG)
+
     # Initialize Mermaid diagram
-    mermaid_lines = [
-        "graph TD",
-        "    %% Styles",
-        "    classDef default fill:#f9f9f9,stroke:#333,stroke-width:2px;",
-        ""
-    ]
-    
-    # Use sets to store unique nodes and relationships
-    nodes = set()
-    # Use a set of tuples for relationships to ensure uniqueness
-    unique_relationships = set()
-    
-    print("\nParsing relationships:")
-    # First pass: collect all unique nodes and relationships
-    for line in content.split('\n'):
-        line = line.strip()
-        if '--' in line and '-->' in line:
-            try:
-                source = line.split('--')[0].strip()
-                target = line.split('-->')[1].strip()
-                relationship = line.split('--')[1].split('-->')[0].strip()
-                
-                # Only print if this is a new relationship
-                relationship_tuple = (source, relationship, target)
-                if relationship_tuple not in unique_relationships:
-                    print(f"  Found new: {source} --{relationship}--> {target}")
-                    nodes.add(source)
-                    nodes.add(target)
-                    unique_relationships.add(relationship_tuple)
-                else:
-                    print(f"  Skipping duplicate: {source} --{relationship}--> {target}")
-            except Exception as e:
-                print(f"  ERROR parsing line: '{line}' - {str(e)}")
-    
-    print(f"\nUnique nodes found ({len(nodes)}):")
-    for node in sorted(nodes):
-        print(f"  - {node}")
-    
-    print(f"\nUnique relationships found ({len(unique_relationships)}):")
-    for rel in sorted(unique_relationships):
-        print(f"  - {rel[0]} --{rel[1]}--> {rel[2]}")
-    
+    mermaid_lines = list(MERMAID_HEADER)
+
+    # First pass: intern all relationships into a triple store, then deduplicate
+    # them on their integer ids
+    start = time.perf_counter()
+    lines_read = errors = 0
+
+    def parsed_relationships(lines):
+        nonlocal lines_read, errors
+        for line in lines:
+            lines_read += 1
+            relationship_tuple = parse_line(line)
+            if relationship_tuple is None:
+                if '-->' in line:
+                    errors += 1
+                    logger.warning("  ERROR parsing line: '%s'", line.strip())
+                continue
+            yield relationship_tuple
+
+    if isinstance(content, TripleStore):
+        store = content
+        lines_read = len(store)
+    elif isinstance(content, str):
+        store = TripleStore.from_triples(parsed_relationships(content.split('\n')))
+    else:
+        store = TripleStore.from_triples(content)
+        lines_read = len(store)
+
+    first = store.first_occurrences()
+    if debug:
+        for is_first, (source, relationship, target) in zip(first.tolist(), store):
+            if is_first:
+                logger.debug("  Found new: %s --%s--> %s", source, relationship, target)
+            else:
+                logger.debug("  Skipping duplicate: %s --%s--> %s", source, relationship, target)
+    unique = store.take(np.flatnonzero(first))
+    duplicates = len(store) - len(unique)
+    used_nodes = np.union1d(unique.source, unique.target)
+    logger.info("Parsed %d lines: %d unique relationships, %d duplicates, %d errors, %d nodes (%.3fs)",
+                lines_read, len(unique), duplicates, errors, len(used_nodes), time.perf_counter() - start)
+
+    # Sanitize each node once and reuse the result for node definitions and edges
+    start = time.perf_counter()
+    entities = store.entities.strings
+    node_texts = [sanitize_node_text(node) for node in entities]
+    node_ids = [text.replace(' ', '_').replace('-', '_') for text in node_texts]
+    sorted_nodes = sorted(used_nodes.tolist(), key=entities.__getitem__)
+    if debug:
+        for node in sorted_nodes:
+            if entities[node] != node_texts[node]:
+                logger.debug("Sanitized: '%s' -> '%s'", entities[node], node_texts[node])
+
     # Add node definitions
-    print("\nGenerating node definitions:")
-    for node in sorted(nodes):
-        sanitized_text = sanitize_node_text(node)
-        node_id = create_node_id(node)
-        node_def = f"    {node_id}[\"{sanitized_text}\"]"
-        print(f"  {node_def}")
+    for node in sorted_nodes:
+        node_def = f"    {node_ids[node]}[\"{node_texts[node]}\"]"
+        if debug:
+            logger.debug("  %s", node_def)
         mermaid_lines.append(node_def)
-    
+
     # Add empty line for readability
     mermaid_lines.append("")
-    
-    # Second pass: add unique relationships
-    print("\nGenerating relationships:")
-    for source, relationship, target in sorted(unique_relationships):
-        try:
-            source_id = create_node_id(source)
-            target_id = create_node_id(target)
-            relationship_line = f"    {source_id} -->|{relationship}| {target_id}"
-            print(f"  {relationship_line}")
-            mermaid_lines.append(relationship_line)
-        except Exception as e:
-            print(f"  ERROR creating relationship: {source} -> {target} - {str(e)}")
-    
+
+    # Second pass: add unique relationships, sorted by their strings
+    relationships = store.relationships.strings
+    order = unique.sorted_order()
+    for source, relationship, target in zip(unique.source[order].tolist(), unique.relationship[order].tolist(),
+                                            unique.target[order].tolist()):
+        relationship_line = f"    {node_ids[source]} -->|{relationships[relationship]}| {node_ids[target]}"
+        if debug:
+            logger.debug("  %s", relationship_line)
+        mermaid_lines.append(relationship_line)
+    logger.info("Generated %d node definitions and %d relationships (%.3fs)",
+                len(sorted_nodes), len(unique), time.perf_counter() - start)
+    instrumentation.annotate(lines=lines_read, nodes=len(sorted_nodes), edges=len(unique),
+                             duplicates=duplicates, errors=errors)
+
     return "\n".join(mermaid_lines)
 
+class MermaidWriter:
+    """Write a Mermaid diagram incrementally: each node is defined just before its first edge."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write("\n".join(MERMAID_HEADER) + "\n")
+        self.defined = set()
+        self.edges = 0
+
+    def add_edge(self, source, relationship, target, node_texts, node_ids):
+        for node in (source, target):
+            if node not in self.defined:
+                self.defined.add(node)
+                self.file.write(f"    {node_ids[node]}[\"{node_texts[node]}\"]\n")
+        self.file.write(f"    {node_ids[source]} -->|{relationship}| {node_ids[target]}\n")
+        self.edges += 1
+
+    def close(self):
+        self.file.close()
+
+class NodeTable:
+    """Interned node and relationship strings mapped to small integer ids."""
+
+    def __init__(self):
+        self.index = {}
+        self.texts = []
+        self.ids = []
+        self.relationships = {}
+
+    def node(self, text):
+        node = self.index.get(text)
+        if node is None:
+            node = len(self.texts)
+            self.index[sys.intern(text)] = node
+            sanitized = sanitize_node_text(text)
+            self.texts.append(sanitized)
+            self.ids.append(sanitized.replace(' ', '_').replace('-', '_'))
+        return node
+
+    def relationship(self, text):
+        rel = self.relationships.get(text)
+        if rel is None:
+            rel = self.relationships[sys.intern(text)] = len(self.relationships)
+        return rel
+
+def iter_table_relationships(file_path):
+    """Triples from a CSV, Parquet or Arrow triple table."""
+    df = read_table(file_path, columns=['Entity A', 'Relationship', 'Entity B'])
+    return zip(df['Entity A'].astype(str), df['Relationship'].astype(str), df['Entity B'].astype(str))
+
+def iter_relationships(file_path):
+    """Stream parsed relationships from a text file (one line at a time) or a triple table."""
+    if is_table(file_path):
+        return iter_table_relationships(file_path)
+    return parse_file(file_path)
+
+def iter_unique_edges(file_path, table):
+    """Stream deduplicated edges as (source id, relationship, target id)."""
+    # Packed integer keys keep the dedupe set small: one int per unique edge
+    seen = set()
+    for source, relationship, target in iter_relationships(file_path):
+        source_id = table.node(source)
+        target_id = table.node(target)
+        key = (source_id << 64) | (table.relationship(relationship) << 32) | target_id
+        if key in seen:
+            continue
+        seen.add(key)
+        yield source_id, sys.intern(relationship), target_id
+
+def component_shards(file_path, table, max_shards):
+    """
+    Map each node to a shard by connected component (union-find over a first pass).
+    The largest components get their own shard; the rest share the last one.
+    """
+    parent = []
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for source, _, target in iter_relationships(file_path):
+        source_id, target_id = table.node(source), table.node(target)
+        while len(parent) < len(table.texts):
+            parent.append(len(parent))
+        root_a, root_b = find(source_id), find(target_id)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    roots = [find(node) for node in range(len(parent))]
+    sizes = {}
+    for root in roots:
+        sizes[root] = sizes.get(root, 0) + 1
+    ranked = sorted(sizes, key=lambda root: (-sizes[root], root))
+    shard_of_root = {root: min(rank, max_shards - 1) for rank, root in enumerate(ranked)}
+    return [f"component_{shard_of_root[root]}" for root in roots]
+
+def load_edge_domains(domains_csv, max_shards=MAX_SHARDS):
+    """
+    Map (Entity A, Relationship, Entity B) to its domain shard, plus an Entity B fallback and
+    the shard of edges found in neither. With more domains than max_shards, the largest
+    domains get their own shard and the rest (and unknown edges) share OTHER_DOMAINS, so
+    at most max_shards files are open at once.
+    """
+    by_triple, by_target = {}, {}
+    df = read_table(domains_csv)
+    domains = df[domain_column(df)].fillna('Unassigned')
+    counts = domains.value_counts()
+    ranked = sorted(counts.index, key=lambda domain: (-counts[domain], domain))
+    fallback = 'Unassigned'
+    shard_of = {domain: domain for domain in ranked}
+    if len(ranked) >= max_shards:
+        fallback = OTHER_DOMAINS
+        shard_of.update({domain: OTHER_DOMAINS for domain in ranked[max(max_shards - 1, 0):]})
+    for domain, entity_a, relationship, entity_b in zip(
+            domains.map(shard_of), df['Entity A'], df['Relationship'], df['Entity B']):
+        key = (sanitize_node_text(entity_a), relationship.strip(), sanitize_node_text(entity_b))
+        by_triple[key] = domain
+        by_target.setdefault(key[2], domain)
+    return by_triple, by_target, fallback
+
+def shard_name(label):
+    """File-name safe shard label."""
+    return re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_') or 'shard'
+
+@instrumentation.traced('stream_mermaid_files')
+def stream_mermaid_files(in_file, output_file, shard_by=None, max_shards=MAX_SHARDS, domains_csv=None):
+    """
+    Generate Mermaid output while streaming the relationships file line by line.
+    Memory depends on the number of unique nodes and edges, not on the file size.
+    With shard_by='component' or 'domain', edges are split across several .mmd files.
+    Returns the list of files written.
+    """
+    logger.info("=== Streaming Mermaid Code ===")
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    table = NodeTable()
+
+    node_shards = edge_domains = None
+    if shard_by == 'component':
+        node_shards = component_shards(in_file, table, max_shards)
+    elif shard_by == 'domain':
+        edge_domains = load_edge_domains(domains_csv, max_shards)
+    elif shard_by is not None:
+        raise ValueError(f"Unknown shard mode: {shard_by}")
+
+    writers = {}
+    for source_id, relationship, target_id in iter_unique_edges(in_file, table):
+        if node_shards is not None:
+            shard = node_shards[source_id]
+        elif edge_domains is not None:
+            by_triple, by_target, fallback = edge_domains
+            target = table.texts[target_id]
+            shard = by_triple.get((table.texts[source_id], relationship, target)) \
+                or by_target.get(target, fallback)
+        else:
+            shard = None
+
+        writer = writers.get(shard)
+        if writer is None:
+            path = f"{output_file}.mmd" if shard is None else f"{output_file}.{shard_name(shard)}.mmd"
+            writer = writers[shard] = MermaidWriter(path)
+        writer.add_edge(source_id, relationship, target_id, table.texts, table.ids)
+
+    for writer in writers.values():
+        writer.close()
+    instrumentation.annotate(nodes=len(table.texts), edges=sum(writer.edges for writer in writers.values()),
+                             shards=len(writers))
+    logger.info("Streamed %d unique relationships over %d nodes into %d file(s) (%.3fs)",
+                sum(writer.edges for writer in writers.values()), len(table.texts), len(writers),
+                time.perf_counter() - start)
+    return [writer.path for writer in writers.values()]
+
+def mermaid_shard(triples):
+    """Mermaid code and distinct triples of one shard (run in a worker process)."""
+    store = TripleStore.from_frame(triples)
+    return create_mermaid_code(store), store.unique().to_frame()
+
+@instrumentation.traced('sharded_mermaid_files')
+def sharded_mermaid_files(in_file, output_file, knowledge, workers=None):
+    """
+    Split the triples by the workflow sections of the knowledge XML and build each
+    workflow's diagram across a process pool, then merge the shards' distinct triples
+    into the full diagram. create_mermaid_code sorts nodes and edges, so the merged
+    diagram is the same as the unsharded one whatever order the shards finish in.
+    Returns the list of files written.
+    """
+    logger.info("=== Sharding by Workflow ===")
+    start = time.perf_counter()
+    shards = workflow_shards(TripleStore.read(in_file).to_frame(), knowledge)
+    results = map_shards(mermaid_shard, [triples for _, triples in shards], workers=workers)
+    logger.info("Built %d workflow diagrams (%.3fs)", len(shards), time.perf_counter() - start)
+
+    paths = []
+    for (workflow, triples), (mermaid_code, _) in zip(shards, results):
+        logger.info("  %s: %d relationships", workflow, len(triples))
+        shard_file = f"{output_file}.{shard_name(workflow)}"
+        save_mermaid_file(mermaid_code, shard_file)
+        paths.append(f"{shard_file}.mmd")
+
+    # Global dedupe across shards happens inside create_mermaid_code
+    unique = pd.concat([triples for _, triples in results], ignore_index=True) if results \
+        else pd.DataFrame(columns=COLUMNS)
+    save_mermaid_file(create_mermaid_code(TripleStore.from_frame(unique)), output_file)
+    paths.append(f"{output_file}.mmd")
+    instrumentation.annotate(shards=len(shards))
+    return paths
+
 def save_mermaid_file(mermaid_code, output_file):
     """Save the Mermaid code to a file with verification."""
-    print("\n=== Saving Output ===")
-    print(f"Saving to: {os.path.abspath(output_file)}.mmd")
-    
+    logger.info("=== Saving Output ===")
+    logger.info("Saving to: %s.mmd", os.path.abspath(output_file))
+
     try:
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
+
         with open(f"{output_file}.mmd", "w", encoding="utf-8") as f:
             f.write(mermaid_code)
-        
+
         # Verify the file was written
         if os.path.exists(f"{output_file}.mmd"):
-            print("File successfully saved!")
-            file_size = os.path.getsize(f"{output_file}.mmd")
-            print(f"File size: {file_size} bytes")
+            logger.info("File successfully saved! (%d bytes)", os.path.getsize(f"{output_file}.mmd"))
         else:
-            print("ERROR: File was not created!")
-            
+            logger.error("ERROR: File was not created!")
+
     except Exception as e:
-        print(f"ERROR saving files: {str(e)}")
+        logger.error("ERROR saving files: %s", e)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a Mermaid ERD from extracted relationships.")
+    parser.add_argument('--input', default="../results/entity_relationship/merged_knowledge.txt",
+                        help="Relationships text, or a CSV/Parquet/Arrow triple table")
+    parser.add_argument('--output', default="../results/erd/merged_knowledge.txt",
+                        help="Output path; '.mmd' is appended")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream the input line by line and write output incrementally")
+    parser.add_argument('--shard-by', choices=['component', 'domain'], default=None,
+                        help="Split the diagram into several .mmd files (implies --stream)")
+    parser.add_argument('--max-shards', type=int, default=MAX_SHARDS,
+                        help="Maximum number of component or domain shards")
+    parser.add_argument('--domains', default="../results/datamesh/domains.csv",
+                        help="Domain table (CSV/Parquet/Arrow) used by --shard-by domain")
+    parser.add_argument('--workflows', default=None, metavar='KNOWLEDGE_XML',
+                        help="Build one diagram per workflow section of this knowledge XML in parallel, "
+                             "plus the merged diagram")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processes used by --workflows (default: one per CPU)")
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help="-v for stage counters and timings, -vv for per-item debug output")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
 
 def main():
-    print("=== ERD Generator Debug Mode (with Deduplication) ===")
-    
-    # File paths
-    input_path = "../results/entity_relationship/"
-    input_file = "merged_knowledge.csv"
-    
-    # Resolve and verify paths
-    input_file_name = os.path.splitext(input_file)[0]
-    in_file = f"{input_path}{input_file_name}.txt"
-    output_file = f"../results/erd/{input_file_name}.txt"
-    
-    print("\nPaths:")
-    print(f"Working directory: {os.getcwd()}")
-    print(f"Input path: {os.path.abspath(input_path)}")
-    print(f"Input file: {os.path.abspath(in_file)}")
-    print(f"Output file: {os.path.abspath(output_file)}")
-    
-    # Check if directories exist
-    print("\nDirectory check:")
-    print(f"Input directory exists: {os.path.exists(input_path)}")
-    print(f"Input file exists: {os.path.exists(in_file)}")
-    print(f"Output directory exists: {os.path.exists(os.path.dirname(output_file))}")
-    
+    args = parse_args()
+    configure_logging(args.verbose)
+    instrumentation.start_from_args(args, 'erd')
+    logger.info("=== ERD Generator (with Deduplication) ===")
+
+    in_file = args.input
+    output_file = args.output
+
+    logger.info("Working directory: %s", os.getcwd())
+    logger.info("Input file: %s (exists: %s)", os.path.abspath(in_file), os.path.exists(in_file))
+    logger.info("Output file: %s", os.path.abspath(output_file))
+
+    start = time.perf_counter()
+    if args.workflows:
+        sharded_mermaid_files(in_file, output_file, args.workflows, workers=args.workers)
+        logger.info("Process complete! (%.3fs)", time.perf_counter() - start)
+        return
+
+    if args.stream or args.shard_by:
+        stream_mermaid_files(in_file, output_file, shard_by=args.shard_by,
+                             max_shards=args.max_shards, domains_csv=args.domains)
+        logger.info("Process complete! (%.3fs)", time.perf_counter() - start)
+        return
+
     # Read content from file
-    content = read_relationships_from_file(in_file)
+    with instrumentation.span('read_relationships'):
+        content = read_relationships_from_file(in_file)
     if not content:
         return
-    
+
     # Create Mermaid code
     mermaid_code = create_mermaid_code(content)
-    
+
     # Save the file
-    save_mermaid_file(mermaid_code, output_file)
-    
-    print("\nProcess complete!")
+    with instrumentation.span('save_mermaid_file'):
+        save_mermaid_file(mermaid_code, output_file)
+
+    logger.info("Process complete! (%.3fs)", time.perf_counter() - start)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
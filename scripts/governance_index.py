@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import sys
+import pandas as pd
+
+from columnar_store import read_table, write_table, domain_column
+from knowledge_loader import iter_sources, SourceMatcher, DYNAMIC_ATTRIBUTES
+
+KNOWLEDGE_XML = '../knowledge/merged.xml'
+DOMAINS_CSV = '../results/datamesh/domains.csv'
+INDEX_PATH = '../results/datamesh/governance.json'
+TABLE_PATH = '../results/datamesh/governance.csv'
+
+# Known Data_Sensitivity values from least to most sensitive
+SENSITIVITY_LEVELS = ['Low', 'Medium', 'High', 'Very High']
+# Source columns joined onto the triples
+SOURCE_ATTRIBUTES = ['Source_Name'] + list(DYNAMIC_ATTRIBUTES)
+
+def attribute_triples(domain_records, records):
+    """
+    Join each domain triple to the sources it came from (see knowledge_loader.SourceMatcher).
+    Match is 'keyword' for triples matching a source's owner and keyword, and 'owner' for the
+    ambiguous fallback to every source of the owner; triples matching no owner are left out.
+    Matching is done once per distinct (Entity A, Entity B) pair.
+    """
+    df = pd.DataFrame(domain_records)
+    triples = pd.DataFrame({
+        'Domain': df[domain_column(df)],
+        'Entity A': df['Entity A'],
+        'Relationship': df['Relationship'],
+        'Entity B': df['Entity B']
+    }).reset_index(names='Triple')
+
+    matcher = SourceMatcher(records)
+    pair_codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([triples['Entity A'], triples['Entity B']]))
+    links = []
+    for pair, (owner, target) in enumerate(pairs):
+        positions, exact = matcher.match(owner, target)
+        links.extend((pair, position, 'keyword' if exact else 'owner') for position in positions)
+    links = pd.DataFrame(links, columns=['Pair', 'Source', 'Match'])
+    sources = pd.DataFrame([{attribute: record[attribute] for attribute in SOURCE_ATTRIBUTES}
+                            for record in matcher.records], columns=SOURCE_ATTRIBUTES)
+
+    joined = triples.assign(Pair=pair_codes).merge(links, on='Pair').join(sources, on='Source')
+    joined = joined.sort_values(['Triple', 'Source'], ignore_index=True)
+    return joined[list(triples.columns) + SOURCE_ATTRIBUTES + ['Match']]
+
+def max_sensitivity(values):
+    """Most sensitive of a set of Data_Sensitivity values (unknown values rank below Low)."""
+    values = [value for value in values if value]
+    if not values:
+        return None
+    return max(values, key=lambda value: (SENSITIVITY_LEVELS.index(value) if value in SENSITIVITY_LEVELS else -1,
+                                          value))
+
+def unique_sorted(values):
+    return sorted({value for value in values if isinstance(value, str) and value})
+
+def governance_attributes(joined):
+    """Paths, policies and sources of a set of triple/source matches."""
+    sensitivities = unique_sorted(joined['Data_Sensitivity'])
+    return {
+        'data_lake_paths': unique_sorted(joined['Data_Lake_Path']),
+        'sensitivity': max_sensitivity(sensitivities),
+        'sensitivities': sensitivities,
+        'access_control': unique_sorted(joined['Access_Control']),
+        'retention_policies': unique_sorted(joined['Retention_Policy']),
+        'update_frequencies': unique_sorted(joined['Update_Frequency']),
+        'sources': unique_sorted(joined['Source_Name'])
+    }
+
+def build_governance_index(domain_records, records):
+    """
+    Precompute, for every domain, the data lake paths, sensitivities, access controls,
+    retention policies, update frequencies and sources its triples come from, plus the
+    reverse data lake path -> domains lookup.
+    Only triples matched on owner and keyword count towards these. Triples matched on their
+    owner alone could come from any source of that owner; their candidate paths and
+    sensitivities are reported separately under 'ambiguous' so the lookup does not over-report.
+    Returns (index, joined table).
+    """
+    df = pd.DataFrame(domain_records)
+    joined = attribute_triples(df, records)
+    triple_counts = df[domain_column(df)].value_counts()
+    exact = joined[joined['Match'] == 'keyword']
+    ambiguous = joined[joined['Match'] == 'owner']
+    exact_groups = dict(iter(exact.groupby('Domain', sort=False)))
+    ambiguous_groups = dict(iter(ambiguous.groupby('Domain', sort=False)))
+    empty = joined.iloc[:0]
+
+    domains = {}
+    for domain in sorted(triple_counts.index, key=str):
+        matched = exact_groups.get(domain, empty)
+        candidates = ambiguous_groups.get(domain, empty)
+        domains[domain] = dict(
+            governance_attributes(matched),
+            triples=int(triple_counts[domain]),
+            attributed_triples=int(matched['Triple'].nunique()),
+            ambiguous=dict(governance_attributes(candidates), triples=int(candidates['Triple'].nunique()))
+        )
+
+    paths = {
+        path: sorted(group['Domain'].unique())
+        for path, group in exact.dropna(subset=['Data_Lake_Path']).groupby('Data_Lake_Path', sort=True)
+    }
+    return {'domains': domains, 'paths': paths}, joined
+
+class GovernanceIndex:
+    """Domain -> governance attributes and data lake path -> domains, as dict lookups."""
+
+    def __init__(self, index):
+        self.domains = index['domains']
+        self.paths = index['paths']
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def save(self, path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'domains': self.domains, 'paths': self.paths}, f, indent=2, ensure_ascii=False)
+        return path
+
+    def domain(self, name):
+        """Governance attributes of a domain."""
+        if name not in self.domains:
+            raise KeyError(f"Unknown domain: {name}")
+        return self.domains[name]
+
+    def domains_for_path(self, path):
+        """Domains with triples matched to a source on a data lake path (owner and keyword matches only)."""
+        if path not in self.paths:
+            raise KeyError(f"Unknown data lake path: {path}")
+        return self.paths[path]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build and query the domain governance index.")
+    parser.add_argument('--index', default=INDEX_PATH, help="Governance index (JSON)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Join source attributes onto the domain triples")
+    build_parser.add_argument('--knowledge', default=KNOWLEDGE_XML, help="Knowledge XML file or glob of XML shards")
+    build_parser.add_argument('--domains', default=DOMAINS_CSV, help="Domain table (CSV/Parquet/Arrow)")
+    build_parser.add_argument('--table', default=TABLE_PATH,
+                              help="Also write the triple/source join (.csv, .parquet or .arrow); empty to skip")
+
+    subparsers.add_parser('domain', help="Paths and policies of a domain").add_argument('name')
+    subparsers.add_parser('path', help="Domains using a data lake path").add_argument('path')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command == 'build':
+        index, joined = build_governance_index(read_table(args.domains), iter_sources(args.knowledge))
+        governance = GovernanceIndex(index)
+        governance.save(args.index)
+        if args.table:
+            write_table(joined, args.table)
+        attributed = sum(entry['attributed_triples'] for entry in governance.domains.values())
+        ambiguous = sum(entry['ambiguous']['triples'] for entry in governance.domains.values())
+        total = sum(entry['triples'] for entry in governance.domains.values())
+        print(f"Governance index of {len(governance.domains)} domains and {len(governance.paths)} data lake paths "
+              f"({attributed} of {total} triples attributed, {ambiguous} matched on owner only) "
+              f"saved to {args.index}")
+        return
+
+    governance = GovernanceIndex.load(args.index)
+    try:
+        result = governance.domain(args.name) if args.command == 'domain' else governance.domains_for_path(args.path)
+    except KeyError as e:
+        print(e.args[0], file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
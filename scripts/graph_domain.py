@@ -1,99 +1,215 @@
-import pandas as pd
+import argparse
+import hashlib
+import importlib.util
+import json
+import sys
 import networkx as nx
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from collections import defaultdict
 from pathlib import Path
 import textwrap
 
+import instrumentation
+from domain_graph_index import DomainGraphIndex
+
 # Define input/output paths
 INPUT_PATH = Path("../results/datamesh/domains.csv")
 OUTPUT_DIR = Path("../results/datamesh")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+LAYOUT_CACHE_DIR = OUTPUT_DIR / ".layout_cache"
+
+# Graphs with more nodes or edges than this are rendered in large-graph mode
+LARGE_GRAPH_THRESHOLD = 200
+LARGE_GRAPH_EDGE_THRESHOLD = 500
+SPRING_ITERATIONS = 50      # Fixed iteration budget for the scalable layout
+MAX_LABEL_ENTITIES = 3      # Shared entities listed on an edge label before truncating
 
 def wrap_label(label, width=15):
     """Wrap text labels with improved width for better readability"""
     return textwrap.fill(label, width=width, break_long_words=False)
 
-def create_domain_entity_graph(csv_path):
-    """Create graph from CSV data with improved entity handling"""
-    df = pd.read_csv(csv_path)
-    domain_entities = defaultdict(set)
+def graph_from_index(index):
+    """NetworkX graph of a DomainGraphIndex; edges carry their shared entities and weight"""
+    G = nx.Graph()
+    G.add_nodes_from(index.domains)
     
-    # Build domain-entity relationships
-    for _, row in df.iterrows():
-        domain = row['Domain']
-        domain_entities[domain].add(row['Entity A'])
-        domain_entities[domain].add(row['Entity B'])
+    # Add edges with shared entities; weight is the number of shared entities
+    for domain1, domain2, shared_entities in index.edges():
+        G.add_edge(domain1, domain2, shared_entities=shared_entities, weight=len(shared_entities))
+    return G
+
+@instrumentation.traced('create_domain_entity_graph')
+def create_domain_entity_graph(csv_path, index_path=None):
+    """
+    Create graph from CSV data with improved entity handling.
+    With index_path, the domain-entity index is also saved for domain_graph_index queries.
+    """
+    # Build domain-entity relationships as an inverted index
+    index = DomainGraphIndex.from_table(csv_path)
+    if index_path is not None:
+        index.save(index_path)
     
     # Create and populate graph
-    G = nx.Graph()
-    domains = list(domain_entities.keys())
-    G.add_nodes_from(domains)
-    
-    # Add edges with shared entities
-    for i in range(len(domains)):
-        for j in range(i + 1, len(domains)):
-            domain1, domain2 = domains[i], domains[j]
-            shared_entities = domain_entities[domain1].intersection(domain_entities[domain2])
-            if shared_entities:
-                # Sort entities for consistent display
-                G.add_edge(domain1, domain2, shared_entities=sorted(list(shared_entities)))
+    G = graph_from_index(index)
+    instrumentation.annotate(nodes=G.number_of_nodes(), edges=G.number_of_edges())
     
     return G
 
-def visualize_graph(G, output_path):
+def is_large_graph(G):
+    """Whether a graph is rendered in large-graph mode by default"""
+    return G.number_of_nodes() > LARGE_GRAPH_THRESHOLD or G.number_of_edges() > LARGE_GRAPH_EDGE_THRESHOLD
+
+def graph_fingerprint(G, layout):
+    """Hash of the graph structure and layout method, used as the layout cache key"""
+    digest = hashlib.sha256(layout.encode('utf-8'))
+    for node in sorted(map(str, G.nodes())):
+        digest.update(f"n:{node}\n".encode('utf-8'))
+    for edge in sorted(tuple(sorted((str(u), str(v)))) + (G.edges[u, v].get('weight', 1),) for u, v in G.edges()):
+        digest.update(f"e:{edge}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def run_layout(G, layout):
+    """Compute node positions with the requested layout algorithm"""
+    if layout == 'kamada_kawai':
+        return nx.kamada_kawai_layout(G)
+    if layout == 'sfdp':
+        # Multilevel force-directed layout from Graphviz, if available
+        try:
+            return nx.nx_agraph.graphviz_layout(G, prog='sfdp')
+        except ImportError:
+            print("pygraphviz not available, falling back to spring layout")
+    # Sparse spring layout with a fixed iteration budget
+    return nx.spring_layout(G, weight='weight', iterations=SPRING_ITERATIONS, seed=42)
+
+def compute_layout(G, layout='auto', cache_dir=LAYOUT_CACHE_DIR, large=None):
+    """
+    Compute or load a cached layout. 'auto' uses kamada_kawai for small graphs only; large
+    graphs (as decided by visualize_graph) get sfdp when pygraphviz is installed, else spring
+    """
+    if layout == 'auto':
+        if large is None:
+            large = is_large_graph(G)
+        if not large:
+            layout = 'kamada_kawai'
+        else:
+            layout = 'sfdp' if importlib.util.find_spec('pygraphviz') is not None else 'spring'
+    
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = Path(cache_dir) / f"{graph_fingerprint(G, layout)}.json"
+        if cache_file.exists():
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            instrumentation.count('layout.cache_hits')
+            return {node: tuple(cached[str(node)]) for node in G.nodes()}
+    
+    with instrumentation.span('layout', method=layout, nodes=G.number_of_nodes(), edges=G.number_of_edges()):
+        pos = run_layout(G, layout)
+    
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({str(node): [float(x), float(y)] for node, (x, y) in pos.items()}, f)
+    return pos
+
+def edge_label(entities, max_entities=MAX_LABEL_ENTITIES):
+    """Edge label listing at most max_entities shared entities"""
+    if max_entities == 0:
+        return f"{len(entities)} shared"
+    label = '\n'.join(entities[:max_entities])
+    if len(entities) > max_entities:
+        label += f"\n(+{len(entities) - max_entities} more)"
+    return label
+
+@instrumentation.traced('visualize_graph')
+def visualize_graph(G, output_path, large=None, layout='auto', cache_dir=LAYOUT_CACHE_DIR,
+                    max_label_entities=MAX_LABEL_ENTITIES):
     """Create a professional visualization of the domain graph"""
+    if large is None:
+        large = is_large_graph(G)
+    
     plt.figure(figsize=(20, 15))
     
-    # Use kamada_kawai_layout for better node positioning
-    pos = nx.kamada_kawai_layout(G)
+    # Use kamada_kawai_layout for better node positioning on small graphs,
+    # a scalable layout (cached by graph structure) on large ones
+    pos = compute_layout(G, layout, cache_dir, large=large)
     
     # Draw nodes with improved styling
     nx.draw_networkx_nodes(G, pos,
                           node_color='lightblue',
-                          node_size=8000,
+                          node_size=200 if large else 8000,
                           alpha=1.0,
                           edgecolors='gray',
-                          linewidths=2)
+                          linewidths=0.5 if large else 2)
     
     # Draw edges with better visibility
     nx.draw_networkx_edges(G, pos,
                           edge_color='gray',
-                          width=2,
-                          alpha=0.6)
+                          width=0.5 if large else 2,
+                          alpha=0.3 if large else 0.6)
     
     # Improve node labels
     labels = {node: wrap_label(node) for node in G.nodes()}
     nx.draw_networkx_labels(G, pos, labels,
-                           font_size=11,
+                           font_size=4 if large else 11,
                            font_weight='bold',
                            font_family='sans-serif')
     
-    # Improve edge labels
-    edge_labels = nx.get_edge_attributes(G, 'shared_entities')
-    edge_labels = {k: '\n'.join(v) for k, v in edge_labels.items()}
-    
-    # Add background to edge labels for better readability
-    bbox_props = dict(boxstyle="round,pad=0.3",
-                     fc="white",
-                     ec="gray",
-                     alpha=0.8)
-    
-    nx.draw_networkx_edge_labels(G, pos, edge_labels,
-                                font_size=9,
-                                bbox=bbox_props,
-                                rotate=False)
+    # Edge labels are unreadable on large graphs; use the JSON export for details
+    if not large:
+        # Improve edge labels
+        edge_labels = nx.get_edge_attributes(G, 'shared_entities')
+        edge_labels = {k: edge_label(v, max_label_entities) for k, v in edge_labels.items()}
+        
+        # Add background to edge labels for better readability
+        bbox_props = dict(boxstyle="round,pad=0.3",
+                         fc="white",
+                         ec="gray",
+                         alpha=0.8)
+        
+        nx.draw_networkx_edge_labels(G, pos, edge_labels,
+                                    font_size=9,
+                                    bbox=bbox_props,
+                                    rotate=False)
     
     plt.axis('off')
     plt.tight_layout()
     
-    # Save with high quality
-    plt.savefig(output_path,
-                dpi=300,
-                bbox_inches='tight',
-                pad_inches=0.5,
-                facecolor='white')
+    # Save with high quality (the format follows the file extension, e.g. .svg for vector output)
+    with instrumentation.span('savefig', large=large):
+        plt.savefig(output_path,
+                    dpi=150 if large else 300,
+                    bbox_inches='tight',
+                    pad_inches=0.5,
+                    facecolor='white')
     plt.close()
+    return pos
+
+def export_graph_json(G, pos, output_path):
+    """Export nodes, positions and edge weights as JSON for an interactive viewer
+    
+    Shared entity lists go to a separate '<name>_edges.json' file, keyed by edge id,
+    so a browser viewer can load them lazily when an edge is selected.
+    """
+    output_path = Path(output_path)
+    details_path = output_path.with_name(f"{output_path.stem}_edges.json")
+    
+    nodes = [
+        {'id': str(node), 'x': float(pos[node][0]), 'y': float(pos[node][1]), 'degree': G.degree(node)}
+        for node in G.nodes()
+    ]
+    edges = []
+    details = {}
+    for i, (domain1, domain2, data) in enumerate(G.edges(data=True)):
+        edges.append({'id': i, 'source': str(domain1), 'target': str(domain2),
+                      'weight': data.get('weight', len(data.get('shared_entities', [])))})
+        details[i] = data.get('shared_entities', [])
+    
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'nodes': nodes, 'edges': edges, 'edge_details': details_path.name}, f)
+    with open(details_path, 'w', encoding='utf-8') as f:
+        json.dump(details, f)
 
 def export_graph_data(G, output_path):
     """Export graph data with improved formatting"""
@@ -116,15 +232,37 @@ def export_graph_data(G, output_path):
             for entity in sorted(data['shared_entities']):
                 f.write(f"  - {entity}\n")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build and visualize the domain relationship graph.")
+    parser.add_argument('--input', type=Path, default=INPUT_PATH, help="Domain table (CSV/Parquet/Arrow)")
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR)
+    parser.add_argument('--large', action='store_true', default=None,
+                        help="Force large-graph rendering (automatic above %d nodes or %d edges)"
+                             % (LARGE_GRAPH_THRESHOLD, LARGE_GRAPH_EDGE_THRESHOLD))
+    parser.add_argument('--layout', default='auto', choices=['auto', 'kamada_kawai', 'spring', 'sfdp'])
+    parser.add_argument('--format', default='png', help="Image format, e.g. png or svg")
+    parser.add_argument('--json', action='store_true', help="Also export an interactive JSON graph")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
 def main():
     """Main execution function"""
+    args = parse_args()
+    instrumentation.start_from_args(args, 'graph')
     try:
-        G = create_domain_entity_graph(INPUT_PATH)
-        visualize_graph(G, OUTPUT_DIR / "domain_relationships.png")
-        export_graph_data(G, OUTPUT_DIR / "domain_relationships.txt")
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        G = create_domain_entity_graph(args.input, args.output_dir / "domain_graph.npz")
+        pos = visualize_graph(G, args.output_dir / f"domain_relationships.{args.format}",
+                              large=args.large, layout=args.layout,
+                              cache_dir=args.output_dir / ".layout_cache")
+        with instrumentation.span('export_graph'):
+            export_graph_data(G, args.output_dir / "domain_relationships.txt")
+            if args.json:
+                export_graph_json(G, pos, args.output_dir / "domain_relationships.json")
         print("Graph generation completed successfully.")
     except Exception as e:
         print(f"Error generating graph: {str(e)}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,177 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+from columnar_store import read_table, write_table
+
+DATA_DIR = '../data'
+CACHE_DIR = '../results/events/.cache'
+EVENTS_PATH = '../results/events/events.parquet'
+# Part of every cache file name; bump it whenever normalize_events changes its output
+NORMALIZER_VERSION = 2
+
+EVENT_COLUMNS = ['Process', 'Case ID', 'Timestamp', 'Performed By', 'Activity', 'Outcome', 'Data Lake Path', 'Details']
+
+# Workbooks name their event time differently; the first column present is used
+TIMESTAMP_COLUMNS = [
+    'Timestamp',
+    'Bed Request Time',
+    'Prediction Time',
+    'Real-Time Update Time',
+    'Task Initiation Time',
+    'Task Completion Time',
+    'Resolution Time'
+]
+
+def file_hash(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalize_events(df, process):
+    """Map a workbook's columns onto the common event table."""
+    events = pd.DataFrame(index=df.index)
+    events['Process'] = process
+    events['Case ID'] = df['Case ID'].astype(str) if 'Case ID' in df.columns else None
+
+    timestamp_column = next((column for column in TIMESTAMP_COLUMNS if column in df.columns), None)
+    events['Timestamp'] = (pd.to_datetime(df[timestamp_column], errors='coerce')
+                           if timestamp_column else pd.NaT)
+
+    events['Performed By'] = df.get('Performed By')
+    # Workbooks without an activity summary describe a single activity: the process itself
+    events['Activity'] = df['Activity Summary'] if 'Activity Summary' in df.columns else process
+    events['Outcome'] = df.get('Outcome')
+    events['Data Lake Path'] = df.get('Data Lake Path')
+
+    # Keep remaining workbook-specific columns as 'column: value' pairs
+    used = {'Case ID', 'Performed By', 'Activity Summary', 'Outcome', 'Data Lake Path', timestamp_column}
+    extra = [column for column in df.columns if column not in used]
+    if extra:
+        # Empty cells are left out rather than written as 'column: nan'
+        events['Details'] = df[extra].apply(
+            lambda row: '; '.join(f"{column}: {value}" for column, value in row.items() if pd.notna(value))
+                        or None,
+            axis=1
+        )
+    else:
+        events['Details'] = None
+
+    # Text columns as plain strings (mixed Excel cell types otherwise break Parquet)
+    for column in EVENT_COLUMNS:
+        if column != 'Timestamp':
+            events[column] = events[column].map(lambda value: None if pd.isna(value) else str(value))
+    return events[EVENT_COLUMNS].reset_index(drop=True)
+
+def load_workbook(path):
+    """Read one process workbook (first sheet) and normalize it to events."""
+    process = os.path.splitext(os.path.basename(path))[0]
+    df = pd.read_excel(path, sheet_name=0, engine='openpyxl')
+    return normalize_events(df, process)
+
+def load_manifest(cache_dir):
+    """Cached mtime/size/hash of every workbook seen so far."""
+    path = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, cache_dir):
+    """Write the workbook manifest atomically."""
+    path = os.path.join(cache_dir, 'manifest.json')
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+def workbook_key(path, manifest):
+    """
+    Content hash of a workbook. The hash is only recomputed when the file's mtime
+    or size differ from the manifest entry.
+    """
+    stat = os.stat(path)
+    entry = manifest.get(os.path.abspath(path))
+    if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        return entry['sha256']
+    key = file_hash(path)
+    manifest[os.path.abspath(path)] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': key}
+    return key
+
+def cache_path(cache_dir, key):
+    """Cached events of the workbook with content hash `key`, for the current normalizer."""
+    return os.path.join(cache_dir, f"{key}-v{NORMALIZER_VERSION}.parquet")
+
+def prune_cache(manifest, cache_dir):
+    """
+    Drop manifest entries of workbooks that no longer exist, and delete cached events
+    that no manifest entry references (older workbook contents or normalizer versions).
+    """
+    for path in [path for path in manifest if not os.path.exists(path)]:
+        del manifest[path]
+    referenced = {os.path.basename(cache_path(cache_dir, entry['sha256'])) for entry in manifest.values()}
+    for name in os.listdir(cache_dir):
+        if name.endswith('.parquet') and name not in referenced:
+            os.remove(os.path.join(cache_dir, name))
+
+def ingest_workbooks(pattern=os.path.join(DATA_DIR, '*.xlsx'), cache_dir=CACHE_DIR, n_jobs=None):
+    """
+    Load all process workbooks into one event table.
+    Each workbook's events are cached as Parquet under its content hash and the normalizer
+    version, so only new or changed workbooks are parsed; those are read in parallel in a
+    process pool. Cache files no longer referenced are removed.
+    """
+    start = time.perf_counter()
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = sorted(path for path in glob.glob(pattern) if not os.path.basename(path).startswith('~$'))
+    manifest = load_manifest(cache_dir)
+
+    cache_files = {}
+    stale = []
+    for path in paths:
+        cache_files[path] = cache_path(cache_dir, workbook_key(path, manifest))
+        if not os.path.exists(cache_files[path]):
+            stale.append(path)
+
+    if stale:
+        workers = min(n_jobs or os.cpu_count() or 1, len(stale))
+        if workers == 1:
+            loaded = [load_workbook(path) for path in stale]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                loaded = list(executor.map(load_workbook, stale))
+        for path, events in zip(stale, loaded):
+            write_table(events, cache_files[path])
+    prune_cache(manifest, cache_dir)
+    save_manifest(manifest, cache_dir)
+
+    frames = [read_table(cache_files[path]) for path in paths]
+    frames = [frame for frame in frames if len(frame)]
+    events = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=EVENT_COLUMNS)
+    print(f"Loaded {len(events)} events from {len(paths)} workbooks "
+          f"({len(stale)} parsed, {len(paths) - len(stale)} cached) in {time.perf_counter() - start:.3f}s")
+    return events
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingest the process Excel workbooks into one event table.")
+    parser.add_argument('--pattern', default=os.path.join(DATA_DIR, '*.xlsx'), help="Workbook glob")
+    parser.add_argument('--output', default=EVENTS_PATH, help="Event table (.parquet, .arrow or .csv)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--jobs', type=int, default=None, help="Processes used to parse workbooks")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    events = ingest_workbooks(args.pattern, args.cache_dir, args.jobs)
+    write_table(events, args.output)
+    print(f"Events saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
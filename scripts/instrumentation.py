@@ -0,0 +1,238 @@
+# Opt-in tracing for the pipeline scripts: timing spans, peak RSS, row/node/edge counts,
+# LLM token and latency counters, and an optional cProfile/pyinstrument run.
+# Nothing is recorded unless a script is started with --trace or --profile; while disabled,
+# span() returns a shared no-op context manager and count()/annotate() return after one check.
+# Traces are Chrome trace JSON (chrome://tracing, ui.perfetto.dev), or JSON lines for .jsonl paths.
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRACE_DIR = '../results/traces'
+PROFILERS = ('cprofile', 'pyinstrument')
+
+_tracer = None
+_NO_SPAN = nullcontext()
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+def peak_rss_bytes():
+    """Peak resident set size of this process, or None where it cannot be measured."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Span:
+    """A timed section of work; its args are written with the trace event."""
+    __slots__ = ('tracer', 'name', 'args', 'start', 'token')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = None
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current_span.set(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        _current_span.reset(self.token)
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.complete(self.name, self.start, end, self.args)
+        return False
+
+class Tracer:
+    """Collects span and counter events in memory and writes them when finished."""
+
+    def __init__(self, trace_path, profile=None):
+        self.trace_path = trace_path
+        self.origin = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = []
+        self.counters = defaultdict(float)
+        self.lock = threading.Lock()
+        self.tids = {}
+        self.profile = profile
+        self.profiler = None
+        if profile == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif profile == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError as e:
+                raise ImportError("--profile pyinstrument requires pyinstrument (pip install pyinstrument)") from e
+            self.profiler = Profiler(async_mode='enabled')
+            self.profiler.start()
+
+    def tid(self):
+        """Small integer id of the current asyncio task or thread, so concurrent spans get their own row."""
+        try:
+            owner = ('task', id(asyncio.current_task()))
+        except RuntimeError:
+            owner = None
+        if owner is None or owner[1] == id(None):
+            owner = ('thread', threading.get_ident())
+        with self.lock:
+            return self.tids.setdefault(owner, len(self.tids) + 1)
+
+    def span(self, name, args):
+        return Span(self, name, args)
+
+    def complete(self, name, start, end, args):
+        rss = peak_rss_bytes()
+        if rss is not None:
+            args['peak_rss_mb'] = round(rss / 2**20, 1)
+        event = {'name': name, 'ph': 'X', 'pid': self.pid, 'tid': self.tid(),
+                 'ts': (start - self.origin) / 1000, 'dur': (end - start) / 1000, 'args': args}
+        with self.lock:
+            self.events.append(event)
+
+    def count(self, name, value):
+        with self.lock:
+            self.counters[name] += value
+            total = self.counters[name]
+            self.events.append({'name': name, 'ph': 'C', 'pid': self.pid, 'tid': 0,
+                                'ts': (time.perf_counter_ns() - self.origin) / 1000, 'args': {name: total}})
+
+    def summary(self):
+        """Total and call count per span name, plus final counter values and peak RSS."""
+        spans = defaultdict(lambda: [0.0, 0])
+        for event in self.events:
+            if event['ph'] == 'X':
+                spans[event['name']][0] += event['dur'] / 1e6
+                spans[event['name']][1] += 1
+        rss = peak_rss_bytes()
+        return {
+            'spans': {name: {'seconds': round(total, 6), 'calls': calls} for name, (total, calls) in spans.items()},
+            'counters': dict(self.counters),
+            'peak_rss_mb': round(rss / 2**20, 1) if rss is not None else None
+        }
+
+    def finish(self):
+        """Stop profiling and write the trace (and profile) next to each other."""
+        stem = os.path.splitext(self.trace_path)[0]
+        os.makedirs(os.path.dirname(self.trace_path) or '.', exist_ok=True)
+        if self.profile == 'cprofile':
+            self.profiler.disable()
+            self.profiler.dump_stats(f"{stem}.prof")
+            print(f"Profile saved to {stem}.prof", file=sys.stderr)
+        elif self.profile == 'pyinstrument':
+            self.profiler.stop()
+            with open(f"{stem}.html", 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html())
+            print(f"Profile saved to {stem}.html", file=sys.stderr)
+
+        summary = self.summary()
+        with open(self.trace_path, 'w', encoding='utf-8') as f:
+            if self.trace_path.endswith('.jsonl'):
+                for event in self.events:
+                    f.write(json.dumps(event) + '\n')
+                f.write(json.dumps({'name': 'summary', 'ph': 'summary', 'args': summary}) + '\n')
+            else:
+                json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms', 'otherData': summary}, f)
+        print(format_summary(summary), file=sys.stderr)
+        print(f"Trace saved to {self.trace_path}", file=sys.stderr)
+
+def format_summary(summary):
+    lines = ["=== Trace summary ==="]
+    for name, span in sorted(summary['spans'].items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f"  {name:<40} {span['seconds']:10.3f}s  x{span['calls']}")
+    for name, value in sorted(summary['counters'].items()):
+        precision = 0 if float(value).is_integer() else 3
+        lines.append(f"  {name:<40} {value:12,.{precision}f}")
+    if summary['peak_rss_mb'] is not None:
+        lines.append(f"  {'peak RSS':<40} {summary['peak_rss_mb']:10.1f} MiB")
+    return '\n'.join(lines)
+
+def enabled():
+    return _tracer is not None
+
+def start(trace_path, profile=None):
+    """Start tracing to trace_path; the trace is written when the process exits."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(trace_path, profile)
+        atexit.register(stop)
+    return _tracer
+
+def stop():
+    """Write the trace and disable tracing."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.finish()
+
+def span(name, **args):
+    """Context manager timing a stage or sub-step; keyword args are recorded with it."""
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.span(name, args)
+
+def annotate(**args):
+    """Attach counts (rows, nodes, edges, ...) to the innermost open span."""
+    if _tracer is None:
+        return
+    current = _current_span.get()
+    if current is not None:
+        current.args.update(args)
+
+def count(name, value=1):
+    """Add to a running counter, e.g. LLM tokens or retries."""
+    if _tracer is None:
+        return
+    _tracer.count(name, value)
+
+def traced(name=None):
+    """Decorator wrapping every call of a function (or coroutine function) in a span."""
+    def decorate(func):
+        label = name or func.__qualname__
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return await func(*args, **kwargs)
+                with _tracer.span(label, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.span(label, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def add_arguments(parser):
+    """Add the --trace and --profile options to a script's argument parser."""
+    parser.add_argument('--trace', default=None,
+                        help="Write a trace of stage timings and counters (.json: Chrome trace, .jsonl: JSON lines)")
+    parser.add_argument('--profile', default=None, choices=PROFILERS,
+                        help="Also profile the run; the profile is written next to the trace")
+
+def start_from_args(args, script):
+    """Start tracing if --trace or --profile was given; --profile alone traces to TRACE_DIR/<script>.json."""
+    if not args.trace and not args.profile:
+        return None
+    return start(args.trace or os.path.join(TRACE_DIR, f"{script}.json"), args.profile)
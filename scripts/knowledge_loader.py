@@ -0,0 +1,111 @@
+import glob
+import hashlib
+import sys
+import xml.etree.ElementTree as ET
+
+# dynamic_attributes copied onto each source record
+DYNAMIC_ATTRIBUTES = (
+    'Data_Lake_Path',
+    'Update_Frequency',
+    'Data_Sensitivity',
+    'Retention_Policy',
+    'Access_Control'
+)
+
+def fingerprint_source(stable_attributes):
+    """Hash every child of a source's <stable_attributes> element."""
+    digest = hashlib.sha256()
+    for attribute in stable_attributes:
+        digest.update(f"{attribute.tag}={(attribute.text or '').strip()}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def _text(element, path):
+    """Stripped, interned text of a child element, or None if it is missing."""
+    child = element.find(path)
+    if child is None or child.text is None:
+        return None
+    # Owners, paths and policies repeat across sources, so share one string per value
+    return sys.intern(child.text.strip())
+
+def resolve_paths(xml_paths):
+    """Expand a path, glob pattern or list of either into a sorted list of XML files."""
+    if isinstance(xml_paths, str):
+        xml_paths = [xml_paths]
+    resolved = []
+    for path in xml_paths:
+        matches = sorted(glob.glob(path)) if glob.has_magic(path) else [path]
+        resolved.extend(matches)
+    return resolved
+
+def source_record(source, workflow=None):
+    """Build a compact source record from a <source> element."""
+    stable = source.find('stable_attributes')
+    keywords = _text(source, 'stable_attributes/Keywords') or ''
+    record = {
+        'Source_Name': _text(source, 'stable_attributes/Source_Name'),
+        'Data_Owner': _text(source, 'stable_attributes/Data_Owner'),
+        'Keywords': [sys.intern(keyword.strip()) for keyword in keywords.split(',') if keyword.strip()],
+        'Fingerprint': fingerprint_source(stable) if stable is not None else None,
+        'Workflow': workflow
+    }
+    for attribute in DYNAMIC_ATTRIBUTES:
+        record[attribute] = _text(source, f'dynamic_attributes/{attribute}')
+    return record
+
+def iter_sources(xml_paths):
+    """
+    Stream source records from one or more knowledge XML files (paths or glob patterns).
+    Each <source> element is cleared once its record has been built, so memory stays
+    flat regardless of file size. A source's workflow is the text of the nearest
+    comment before it (e.g. "<!-- Admission Process -->").
+    """
+    for xml_path in resolve_paths(xml_paths):
+        root = None
+        workflow = None
+        for event, element in ET.iterparse(xml_path, events=('start', 'end', 'comment')):
+            if event == 'comment':
+                workflow = sys.intern((element.text or '').strip()) or workflow
+                continue
+            if root is None:
+                root = element
+            if event != 'end' or element.tag != 'source':
+                continue
+            yield source_record(element, workflow)
+            # Drop the processed element and detach it from the root
+            element.clear()
+            root.clear()
+
+def match_key(text):
+    """Case- and whitespace-insensitive form of an owner or keyword used for matching."""
+    return text.strip().lower() if isinstance(text, str) else ''
+
+class SourceMatcher:
+    """
+    Find the source records a relationship was generated from. The extraction prompt makes
+    Entity A the data owner and Entity B one of the keywords, so a relationship matches the
+    sources with that owner and keyword; failing that, every source of the owner is a
+    possible (ambiguous) match.
+    """
+
+    def __init__(self, records):
+        self.records = list(records)
+        self.by_keyword = {}
+        self.by_owner = {}
+        for i, record in enumerate(self.records):
+            owner = match_key(record['Data_Owner'])
+            self.by_owner.setdefault(owner, []).append(i)
+            for keyword in record['Keywords']:
+                positions = self.by_keyword.setdefault((owner, match_key(keyword)), [])
+                if not positions or positions[-1] != i:
+                    positions.append(i)
+
+    def match(self, owner, target):
+        """
+        (record positions in document order, exact): the sources matching on owner and keyword
+        with exact=True, else all sources of the owner with exact=False ([] if there are none).
+        """
+        owner = match_key(owner)
+        positions = self.by_keyword.get((owner, match_key(target)))
+        if positions:
+            return positions, True
+        return self.by_owner.get(owner, []), False
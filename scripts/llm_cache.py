@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import time
+
+# Default cache location and eviction limits
+CACHE_DIR = "../results/entity_relationship/.llm_cache"
+MAX_CACHE_BYTES = 100 * 1024 * 1024
+MAX_AGE_DAYS = 30
+
+def make_cache_key(model, prompt, data_owner, keywords):
+    """Content hash of everything that determines the LLM output for one source."""
+    payload = json.dumps({
+        'model': model,
+        'prompt': prompt,
+        'data_owner': data_owner,
+        'keywords': list(keywords)
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    Persistent content-addressed cache for LLM responses.
+    Entries are stored as one JSON file per key; the least recently used entries
+    are evicted once the cache exceeds its size budget, and entries older than
+    max_age_days are dropped.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, max_age_days=MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 24 * 3600 if max_age_days is not None else None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        # Shard by key prefix to keep directories small
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)['value']
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        # Refresh the timestamp so eviction is least-recently-used
+        os.utime(path)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store value under key, writing atomically."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'value': value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """Remove expired entries, then least recently used ones until under the size budget."""
+        now = time.time()
+        entries = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith('.json'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                if self.max_age is not None and now - stat.st_mtime > self.max_age:
+                    os.remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        if self.max_bytes is not None and total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+                removed += 1
+        return removed
+
+    def report(self):
+        """Print hit/miss counters for this run."""
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups * 100) if lookups else 0.0
+        print(f"LLM cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)")
@@ -0,0 +1,218 @@
+import argparse
+import ast
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = '../results/.pipeline_state.json'
+
+# A stage runs one script from the scripts/ directory. Inputs and outputs are paths
+# relative to scripts/ (inputs may be glob patterns); dependencies between stages
+# follow from one stage's outputs being another stage's inputs.
+Stage = namedtuple('Stage', ['name', 'args', 'inputs', 'outputs'])
+
+STAGES = [
+    Stage('extract',
+          ['entitiy_relationships.py', '--input', '../knowledge/merged.xml', '--incremental'],
+          ['../knowledge/merged.xml'],
+          ['../results/entity_relationship/merged_knowledge.txt',
+           '../results/entity_relationship/merged_knowledge.csv']),
+    Stage('erd',
+          ['erd.py', '--input', '../results/entity_relationship/merged_knowledge.txt',
+           '--output', '../results/erd/merged_knowledge.txt'],
+          ['../results/entity_relationship/merged_knowledge.txt'],
+          ['../results/erd/merged_knowledge.txt.mmd']),
+    Stage('domains',
+          ['domain.py', '--input', '../results/entity_relationship/merged_knowledge.csv',
+           '--output-dir', '../results/datamesh'],
+          ['../results/entity_relationship/merged_knowledge.csv'],
+          ['../results/datamesh/domains.csv']),
+    Stage('graph',
+          ['graph_domain.py', '--input', '../results/datamesh/domains.csv', '--output-dir', '../results/datamesh'],
+          ['../results/datamesh/domains.csv'],
+          ['../results/datamesh/domain_relationships.png', '../results/datamesh/domain_relationships.txt',
+           '../results/datamesh/domain_graph.npz']),
+    Stage('ingest',
+          ['ingest_workbooks.py', '--pattern', '../data/*.xlsx', '--output', '../results/events/events.parquet'],
+          ['../data/*.xlsx'],
+          ['../results/events/events.parquet']),
+    Stage('mapping',
+          ['process_mapping.py', '--events', '../results/events/events.parquet',
+           '--domains', '../results/datamesh/domains.csv', '--output-dir', '../results/mapping'],
+          ['../results/events/events.parquet', '../results/datamesh/domains.csv'],
+          ['../results/mapping/process_domains.csv', '../results/mapping/process_coverage.csv']),
+    Stage('governance',
+          ['governance_index.py', '--index', '../results/datamesh/governance.json', 'build',
+           '--knowledge', '../knowledge/merged.xml', '--domains', '../results/datamesh/domains.csv',
+           '--table', '../results/datamesh/governance.csv'],
+          ['../knowledge/merged.xml', '../results/datamesh/domains.csv'],
+          ['../results/datamesh/governance.json', '../results/datamesh/governance.csv']),
+]
+
+def resolve(path):
+    """Absolute path of a path given relative to the scripts directory."""
+    return os.path.normpath(os.path.join(SCRIPTS_DIR, path))
+
+def stage_dependencies(stages):
+    """Map each stage name to the names of the stages producing its inputs."""
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            producers[resolve(output)] = stage.name
+    return {
+        stage.name: sorted({producers[resolve(path)] for path in stage.inputs
+                            if resolve(path) in producers and producers[resolve(path)] != stage.name})
+        for stage in stages
+    }
+
+def local_modules(script):
+    """The script and every scripts/ module it imports, directly or through other local modules."""
+    found = set()
+    pending = [resolve(script)]
+    while pending:
+        path = pending.pop()
+        if path in found or not os.path.exists(path):
+            continue
+        found.add(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            pending.extend(resolve(f"{name.split('.')[0]}.py") for name in names)
+    return sorted(found)
+
+def hash_inputs(stage):
+    """
+    Content hash of a stage's command, the code it runs (its script and the local modules
+    that script imports) and all files matching its inputs.
+    """
+    digest = hashlib.sha256(json.dumps(stage.args).encode('utf-8'))
+    paths = local_modules(stage.args[0]) + [path for pattern in stage.inputs
+                                            for path in sorted(glob.glob(resolve(pattern)))]
+    for path in paths:
+        digest.update(path.encode('utf-8'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(state, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+def is_stale(stage, input_hash, state):
+    """A stage is stale when its inputs, command or code changed or any output is missing."""
+    if state.get(stage.name) != input_hash:
+        return True
+    return not all(os.path.exists(resolve(output)) for output in stage.outputs)
+
+def run_stage(stage):
+    """Run a stage's script from the scripts directory; returns (exit code, seconds)."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable] + stage.args, cwd=SCRIPTS_DIR)
+    return result.returncode, time.perf_counter() - start
+
+def run_pipeline(stages=STAGES, selected=None, force=False, jobs=2, dry_run=False, state_file=STATE_FILE):
+    """
+    Run the stage DAG. Independent stages run in parallel (up to `jobs` at a time);
+    a stage is skipped when the content hash of its inputs and code matches the last successful run.
+    Returns True if every stage succeeded or was up to date.
+    """
+    if selected:
+        stages = [stage for stage in stages if stage.name in selected]
+    dependencies = stage_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    state_path = resolve(state_file)
+    state = load_state(state_path)
+
+    done, failed = set(), set()
+    pending = [stage.name for stage in stages]
+    running = {}
+    ok = True
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            # Start every stage whose upstream stages have finished
+            for name in list(pending):
+                upstream = dependencies[name]
+                if any(dep in failed for dep in upstream):
+                    print(f"[{name}] skipped: upstream stage failed")
+                    pending.remove(name)
+                    failed.add(name)
+                    continue
+                if not all(dep in done for dep in upstream):
+                    continue
+                pending.remove(name)
+                stage = by_name[name]
+                # Inputs are hashed only now, after upstream stages have written them
+                input_hash = hash_inputs(stage)
+                if not force and not is_stale(stage, input_hash, state):
+                    print(f"[{name}] up to date")
+                    done.add(name)
+                    continue
+                if dry_run:
+                    print(f"[{name}] would run: {' '.join(stage.args)}")
+                    done.add(name)
+                    continue
+                print(f"[{name}] running: {' '.join(stage.args)}")
+                running[executor.submit(run_stage, stage)] = (name, input_hash)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, input_hash = running.pop(future)
+                returncode, seconds = future.result()
+                # A zero exit only counts when the stage also wrote every declared output
+                missing = [output for output in by_name[name].outputs if not os.path.exists(resolve(output))]
+                if returncode == 0 and missing:
+                    print(f"[{name}] failed: missing outputs {', '.join(missing)}")
+                    failed.add(name)
+                    ok = False
+                elif returncode == 0:
+                    print(f"[{name}] finished in {seconds:.1f}s")
+                    state[name] = input_hash
+                    save_state(state, state_path)
+                    done.add(name)
+                else:
+                    print(f"[{name}] failed with exit code {returncode}")
+                    failed.add(name)
+                    ok = False
+    return ok and not failed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the CCM pipeline as a DAG of cached stages.")
+    parser.add_argument('stages', nargs='*', help="Stages to run (default: all): "
+                        + ', '.join(stage.name for stage in STAGES))
+    parser.add_argument('--force', action='store_true', help="Run stages even if their inputs are unchanged")
+    parser.add_argument('--jobs', type=int, default=2, help="Stages run in parallel")
+    parser.add_argument('--dry-run', action='store_true', help="Only report which stages would run")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    ok = run_pipeline(selected=args.stages, force=args.force, jobs=args.jobs, dry_run=args.dry_run)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
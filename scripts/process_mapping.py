@@ -0,0 +1,220 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from columnar_store import read_table, write_table, domain_column
+from ingest_workbooks import ingest_workbooks, DATA_DIR, EVENTS_PATH
+
+DOMAINS_CSV = '../results/datamesh/domains.csv'
+OUTPUT_DIR = '../results/mapping'
+
+# Event columns looked up in the entity index, in order of preference
+MATCH_COLUMNS = ['Activity', 'Outcome', 'Process']
+# Event columns combined into the text compared with the domain centroids
+FUZZY_COLUMNS = ['Process', 'Activity', 'Outcome']
+
+MIN_SIMILARITY = 0.1   # Cosine similarity below which an event stays unmapped
+BATCH_SIZE = 4096      # Distinct event texts scored against the centroids at a time
+UNMAPPED = 'Unmapped'
+
+def normalize_text(values):
+    """Lower-case, whitespace-collapsed strings (missing values become '')."""
+    return (pd.Series(values, dtype=object).fillna('').astype(str)
+            .str.lower().str.split().str.join(' '))
+
+def make_centroid_vectorizer():
+    """TF-IDF vectorizer for the domain centroids."""
+    return TfidfVectorizer(
+        stop_words='english',
+        ngram_range=(1, 2),
+        sublinear_tf=True
+    )
+
+class ProcessDomainMapper:
+    """
+    Map event log rows to data domains. An event is first looked up by exact entity name in
+    a hashed entity -> domain index; events without an exact match go to the domain whose
+    TF-IDF centroid is most similar to the event text. Work is done once per distinct
+    text, so cost depends on the vocabulary of the logs rather than their length.
+    """
+
+    def __init__(self, entity_index, domains, vectorizer, centroids, min_similarity=MIN_SIMILARITY):
+        self.entity_index = entity_index
+        self.domains = domains
+        self.vectorizer = vectorizer
+        self.centroids = centroids
+        self.min_similarity = min_similarity
+
+    @classmethod
+    def fit(cls, domain_records, min_similarity=MIN_SIMILARITY):
+        """Build the entity index and domain centroids from a domain table."""
+        df = pd.DataFrame(domain_records)
+        domain_codes, domains = pd.factorize(df[domain_column(df)].fillna(UNMAPPED))
+
+        # Entity -> domain: the domain with most triples mentioning the entity
+        # (ties go to the alphabetically first domain)
+        mentions = pd.DataFrame({
+            'Entity': pd.concat([normalize_text(df['Entity A']), normalize_text(df['Entity B'])],
+                                ignore_index=True),
+            'Domain': np.concatenate([domains[domain_codes], domains[domain_codes]])
+        })
+        mentions = mentions[mentions['Entity'] != '']
+        counts = mentions.groupby(['Entity', 'Domain']).size().reset_index(name='Count')
+        counts = counts.sort_values(['Entity', 'Count', 'Domain'], ascending=[True, False, True])
+        entity_index = dict(zip(*counts.drop_duplicates('Entity')[['Entity', 'Domain']].to_numpy().T))
+
+        # Centroid of each domain: the mean of its triples' TF-IDF vectors
+        texts = (df['Entity A'].fillna('').astype(str) + ' ' + df['Relationship'].fillna('').astype(str)
+                 + ' ' + df['Entity B'].fillna('').astype(str))
+        vectorizer = make_centroid_vectorizer()
+        vectors = vectorizer.fit_transform(texts)
+        membership = sp.csr_matrix((np.ones(len(df)), (domain_codes, np.arange(len(df)))),
+                                   shape=(len(domains), len(df)))
+        centroids = normalize(membership @ vectors)
+        return cls(entity_index, np.asarray(domains, dtype=object), vectorizer, centroids, min_similarity)
+
+    def exact_match(self, events):
+        """Domain of every event from the entity index (None where no column matches)."""
+        matched = pd.Series(None, index=events.index, dtype=object)
+        for column in MATCH_COLUMNS:
+            if column not in events.columns:
+                continue
+            missing = matched.isna()
+            if not missing.any():
+                break
+            # Normalization and hash lookups on the distinct values of the column only
+            codes, values = pd.factorize(events.loc[missing, column].fillna(''))
+            domains = normalize_text(values).map(self.entity_index).to_numpy()
+            matched.loc[missing] = domains[codes]
+        return matched
+
+    def nearest_centroids(self, texts, batch_size=BATCH_SIZE):
+        """(domain, similarity) of the nearest centroid for each text, scored in sparse batches."""
+        domains = np.empty(len(texts), dtype=object)
+        similarities = np.zeros(len(texts))
+        for start in range(0, len(texts), batch_size):
+            vectors = self.vectorizer.transform(texts[start:start + batch_size])
+            scores = (vectors @ self.centroids.T).toarray()
+            best = scores.argmax(axis=1) if scores.shape[1] else np.zeros(len(scores), dtype=int)
+            best_scores = scores[np.arange(len(scores)), best] if scores.shape[1] else np.zeros(len(scores))
+            domains[start:start + len(best)] = np.where(best_scores >= self.min_similarity,
+                                                        self.domains[best] if len(self.domains) else UNMAPPED,
+                                                        UNMAPPED)
+            similarities[start:start + len(best)] = best_scores
+        return domains, similarities
+
+    def map_events(self, events, batch_size=BATCH_SIZE):
+        """Events with 'Domain', 'Match' ('exact', 'centroid' or 'none') and 'Similarity' columns."""
+        events = events.copy()
+        domains = self.exact_match(events)
+        match = np.where(domains.notna(), 'exact', 'none').astype(object)
+        similarity = np.where(domains.notna(), 1.0, 0.0)
+
+        fuzzy = domains.isna().to_numpy()
+        if fuzzy.any():
+            columns = [column for column in FUZZY_COLUMNS if column in events.columns]
+            texts = None
+            for column in columns:
+                values = events.loc[fuzzy, column].fillna('').astype(str)
+                texts = values if texts is None else texts + ' ' + values
+            codes, distinct = pd.factorize(texts)
+            nearest, scores = self.nearest_centroids(normalize_text(distinct).tolist(), batch_size)
+            domains.loc[fuzzy] = nearest[codes]
+            similarity[fuzzy] = scores[codes]
+            match[fuzzy] = np.where(nearest[codes] == UNMAPPED, 'none', 'centroid')
+
+        events['Domain'] = domains.to_numpy()
+        events['Match'] = match
+        events['Similarity'] = similarity.round(4)
+        return events
+
+def process_coverage(mapped):
+    """
+    Per-process domain coverage: one row per (process, domain) with the event count and its
+    share of the process's events, and one summary row per process.
+    Processes and domains are factorized once and counted with bincount.
+    """
+    process_codes, processes = pd.factorize(mapped['Process'].fillna(''), sort=True)
+    domain_codes, domains = pd.factorize(mapped['Domain'], sort=True)
+    domains = np.asarray(domains, dtype=object)
+    n_domains = len(domains)
+    similarity = mapped['Similarity'].to_numpy(dtype=float)
+    is_mapped = domains[domain_codes] != UNMAPPED if len(mapped) else np.zeros(0, dtype=bool)
+
+    pairs = process_codes.astype(np.int64) * n_domains + domain_codes
+    size = len(processes) * n_domains
+    events = np.bincount(pairs, minlength=size)
+    similarity_sums = np.bincount(pairs, weights=similarity, minlength=size)
+    present = np.flatnonzero(events)
+    process_events = np.bincount(process_codes, minlength=len(processes))
+
+    coverage = pd.DataFrame({
+        'Process': np.asarray(processes, dtype=object)[present // n_domains],
+        'Domain': domains[present % n_domains],
+        'Events': events[present],
+        'Mean Similarity': (similarity_sums[present] / events[present]).round(4),
+        'Share': (events[present] / process_events[present // n_domains]).round(4)
+    })
+    coverage = coverage.sort_values(['Process', 'Events', 'Domain'], ascending=[True, False, True],
+                                    ignore_index=True)
+
+    mapped_coverage = coverage[coverage['Domain'] != UNMAPPED]
+    primary = mapped_coverage.drop_duplicates('Process').set_index('Process')['Domain']
+    mapped_events = np.bincount(process_codes, weights=is_mapped, minlength=len(processes)).astype(int)
+    exact_events = np.bincount(process_codes, weights=(mapped['Match'] == 'exact').to_numpy(),
+                               minlength=len(processes)).astype(int)
+    summary = pd.DataFrame({
+        'Process': np.asarray(processes, dtype=object),
+        'Events': process_events,
+        'Mapped': mapped_events,
+        'Exact': exact_events,
+        'Coverage': (mapped_events / np.maximum(process_events, 1)).round(4)
+    })
+    summary['Primary Domain'] = summary['Process'].map(primary).fillna(UNMAPPED)
+    summary['Domains'] = summary['Process'].map(mapped_coverage.groupby('Process').size()).fillna(0).astype(int)
+    return coverage, summary
+
+def load_events(events_path, pattern):
+    """The ingested event table, ingesting the workbooks first if it does not exist yet."""
+    if os.path.exists(events_path):
+        return read_table(events_path)
+    return ingest_workbooks(pattern)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Map process events to data domains.")
+    parser.add_argument('--events', default=EVENTS_PATH, help="Event table written by ingest_workbooks.py")
+    parser.add_argument('--pattern', default=os.path.join(DATA_DIR, '*.xlsx'),
+                        help="Workbooks ingested when the event table does not exist")
+    parser.add_argument('--domains', default=DOMAINS_CSV, help="Domain table (CSV/Parquet/Arrow)")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--format', default='csv', choices=['csv', 'parquet', 'arrow'],
+                        help="Format of the coverage tables")
+    parser.add_argument('--events-output', default=None, help="Also write every event with its domain")
+    parser.add_argument('--min-similarity', type=float, default=MIN_SIMILARITY)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    mapper = ProcessDomainMapper.fit(read_table(args.domains), min_similarity=args.min_similarity)
+    events = load_events(args.events, args.pattern)
+    mapped = mapper.map_events(events, batch_size=args.batch_size)
+    coverage, summary = process_coverage(mapped)
+    print(f"Mapped {(mapped['Domain'] != UNMAPPED).sum()} of {len(mapped)} events "
+          f"({(mapped['Match'] == 'exact').sum()} exact) to {len(mapper.domains)} domains "
+          f"in {time.perf_counter() - start:.3f}s")
+
+    write_table(coverage, os.path.join(args.output_dir, f"process_domains.{args.format}"))
+    write_table(summary, os.path.join(args.output_dir, f"process_coverage.{args.format}"))
+    if args.events_output:
+        write_table(mapped, args.events_output)
+    print(f"Coverage tables saved to {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import csv
+import os
+import random
+import re
+import time
+from collections import namedtuple
+
+from columnar_store import table_format, write_table
+
+Triple = namedtuple('Triple', ['source', 'relationship', 'target'])
+
+RELATIONSHIPS_TXT = '../results/entity_relationship/merged_knowledge.txt'
+RELATIONSHIPS_CSV = '../results/entity_relationship/merged_knowledge.csv'
+COLUMNS = ['Entity A', 'Relationship', 'Entity B']
+
+# List numbering, bullets and '>' quote markers the LLM puts in front of a line
+LEADING_NOISE = re.compile(r"(?:(?:\d+[.)]|[-*\u2022>])\s*)+")
+NOISE_START = set('-*\u2022>0123456789')
+QUOTES = " \t`'\"*"
+TARGET_PREFIX = QUOTES + ">"
+TARGET_SUFFIX = QUOTES + ".,;"
+
+def parse_line(line):
+    """
+    Parse one 'Entity A --Relationship--> Entity B' line into a Triple, or return None.
+    A single scan with str.find locates the two arrow markers; the usual LLM noise
+    (numbering, bullets, '>' markers, quotes/backticks/bold, spaces inside the arrow,
+    trailing punctuation) is then stripped from the parts.
+    """
+    arrow = line.find('-->')
+    if arrow < 0:
+        return None
+    dash = line.find('--')
+    if dash == arrow:
+        # 'A --> B' has no relationship text
+        return None
+
+    source = line[:dash].strip()
+    if source and source[0] in NOISE_START:
+        noise = LEADING_NOISE.match(source)
+        if noise is not None:
+            source = source[noise.end():]
+    source = source.strip(QUOTES)
+    relationship = line[dash + 2:arrow].strip()
+    target = line[arrow + 3:].lstrip(TARGET_PREFIX).rstrip(TARGET_SUFFIX + '\r\n')
+    # 'A ---> B' and 'A -- --> B' have no relationship text either
+    if not source or not relationship or not target:
+        return None
+    return Triple(source, relationship, target)
+
+def parse_lines(lines):
+    """Yield a Triple for every relationship line in an iterable of lines."""
+    for line in lines:
+        if '-->' in line:
+            triple = parse_line(line)
+            if triple is not None:
+                yield triple
+
+def parse_file(file_path):
+    """Stream Triples from a relationships text file."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        yield from parse_lines(file)
+
+def write_triples(triples, output_path, dedupe=False):
+    """
+    Write triples as the table read by domain.py.
+    The format follows the output extension (.csv, .parquet or .arrow).
+    """
+    if dedupe:
+        triples = dict.fromkeys(triples)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    if table_format(output_path) != 'csv':
+        import pandas as pd
+        return write_table(pd.DataFrame(list(triples), columns=COLUMNS), output_path)
+
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(triples)
+    return output_path
+
+def convert(input_path, output_path, dedupe=False):
+    """Convert an LLM relationships text file into a triple table."""
+    return write_triples(parse_file(input_path), output_path, dedupe=dedupe)
+
+def synthetic_lines(n_lines, seed=42):
+    """Relationship lines with typical LLM formatting noise, for benchmarking."""
+    rng = random.Random(seed)
+    owners = ['Primary Health Care Nurse', 'Psychologist', 'Physician', 'bed manager', 'ED Staff']
+    verbs = ['performs', 'conducts', 'updates', 'refers to', 'monitors']
+    objects = ['Initial Health Assessment', 'Medical Files Update', 'Bed Allocation', 'Real-Time Updates']
+    templates = ['{a} --{r}--> {b}', '{i}. {a} --{r}--> {b}', '- **{a}** -- {r} --> {b}.', '> {a} --{r}--> > {b}']
+    return [
+        rng.choice(templates).format(i=i, a=rng.choice(owners), r=rng.choice(verbs), b=rng.choice(objects))
+        for i in range(n_lines)
+    ]
+
+def benchmark(n_lines=1000000, repeat=3):
+    """Measure parsing throughput in lines per second."""
+    lines = synthetic_lines(n_lines)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in parse_lines(lines))
+        best = min(best, time.perf_counter() - start)
+    print(f"Parsed {count} of {n_lines} lines in {best:.3f}s ({n_lines / best:,.0f} lines/s)")
+    return n_lines / best
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parse LLM relationship output into triples.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = subparsers.add_parser('convert', help="Convert relationships text to CSV, Parquet or Arrow")
+    convert_parser.add_argument('input', nargs='?', default=RELATIONSHIPS_TXT)
+    convert_parser.add_argument('output', nargs='?', default=RELATIONSHIPS_CSV)
+    convert_parser.add_argument('--dedupe', action='store_true', help="Drop duplicate triples")
+
+    benchmark_parser = subparsers.add_parser('benchmark', help="Measure parsing throughput")
+    benchmark_parser.add_argument('--lines', type=int, default=1000000)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command == 'convert':
+        output_path = convert(args.input, args.output, dedupe=args.dedupe)
+        print(f"Triples saved to {output_path}")
+    else:
+        benchmark(args.lines)
+
+if __name__ == "__main__":
+    main()
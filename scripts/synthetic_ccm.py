@@ -0,0 +1,133 @@
+import argparse
+import os
+import random
+from xml.sax.saxutils import escape
+import numpy as np
+import pandas as pd
+
+from columnar_store import write_table
+
+# Word pools used to build entity, owner and relationship names
+ROLES = ['Nurse', 'Physician', 'Psychologist', 'Bed Manager', 'ED Staff', 'Administrator', 'Pharmacist',
+         'Social Worker', 'Therapist', 'Coordinator']
+QUALIFIERS = ['Primary', 'Senior', 'Inpatient', 'Outpatient', 'Emergency', 'Psychiatric', 'Clinical', 'Regional']
+ACTIVITIES = ['Assessment', 'Screening', 'Referral', 'Transfer', 'Evaluation', 'Allocation', 'Monitoring',
+              'Prediction', 'Discharge', 'Treatment', 'Admission', 'Coordination', 'Reporting', 'Scheduling']
+OBJECTS = ['Health', 'Bed', 'Medication', 'Risk', 'Patient', 'Record', 'Symptom', 'Therapy', 'Capacity',
+           'Workflow', 'Diagnosis', 'Lab Result', 'Care Plan', 'Incident']
+VERBS = ['performs', 'conducts', 'updates', 'reviews', 'manages', 'coordinates', 'monitors', 'refers',
+         'approves', 'documents']
+
+def entity_names(n, rng, pools):
+    """n distinct names built from word pools, numbered once the combinations run out."""
+    names = []
+    seen = set()
+    while len(names) < n:
+        name = ' '.join(rng.choice(pool) for pool in pools)
+        if name in seen:
+            name = f"{name} {len(names)}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+def generate_triples(n_triples, n_domains=None, seed=42):
+    """
+    Synthetic Entity A/Relationship/Entity B triples. Entity counts grow with the square root
+    of the triple count, like a real CCM where owners and activities repeat heavily.
+    With n_domains, a 'Domain name' column assigns each triple to one of n_domains domains.
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    n_owners = max(5, int(n_triples ** 0.5 / 4))
+    n_objects = max(10, int(n_triples ** 0.5))
+    owners = np.array(entity_names(n_owners, rng, [QUALIFIERS, ROLES]), dtype=object)
+    objects = np.array(entity_names(n_objects, rng, [OBJECTS, ACTIVITIES]), dtype=object)
+    verbs = np.array(VERBS, dtype=object)
+
+    # Skewed popularity, as in real relationship extractions
+    owner_ids = np.minimum(np_rng.zipf(1.5, n_triples) - 1, n_owners - 1)
+    object_ids = np_rng.integers(0, n_objects, n_triples)
+    df = pd.DataFrame({
+        'Entity A': owners[owner_ids],
+        'Relationship': verbs[np_rng.integers(0, len(verbs), n_triples)],
+        'Entity B': objects[object_ids]
+    })
+    if n_domains:
+        # Domains follow the target entity, spread over a few neighbouring domains,
+        # so domains share entities the way clustered ones do
+        spread = max(3, 2 * n_domains // n_objects)
+        domain_ids = (object_ids * 7919 + np_rng.integers(0, spread, n_triples)) % n_domains
+        df.insert(0, 'Domain name', [f"Domain {i} Management" for i in domain_ids])
+    return df
+
+def relationship_lines(triples):
+    """Yield triples as LLM-style relationship lines, with some formatting noise."""
+    for i, (source, relationship, target) in enumerate(
+            zip(triples['Entity A'], triples['Relationship'], triples['Entity B'])):
+        if i % 10 == 0:
+            yield f"{i}. {source} --{relationship}--> {target}\n"
+        else:
+            yield f"{source} --{relationship}--> {target}\n"
+
+def knowledge_xml_lines(n_sources, seed=42):
+    """Yield a merged.xml-style knowledge file with n_sources <source> entries."""
+    rng = random.Random(seed)
+    owners = entity_names(max(5, min(n_sources // 10, 1000)), rng, [QUALIFIERS, ROLES])
+    keywords = entity_names(max(20, min(n_sources, 5000)), rng, [OBJECTS, ACTIVITIES])
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<sources>\n'
+    for i in range(n_sources):
+        workflow = rng.choice(ACTIVITIES)
+        yield f"""    <!-- {workflow} Process -->
+    <source>
+        <stable_attributes>
+            <Source_Name>{workflow} Data {i}</Source_Name>
+            <Data_Owner>{escape(rng.choice(owners))}</Data_Owner>
+            <Keywords>{escape(', '.join(rng.sample(keywords, 4)))}</Keywords>
+        </stable_attributes>
+        <dynamic_attributes>
+            <Data_Lake_Path>/datalake/{workflow.lower()}/</Data_Lake_Path>
+            <Update_Frequency>{rng.choice(['Daily', 'Weekly', 'Real-time', 'As-needed'])}</Update_Frequency>
+            <Data_Sensitivity>{rng.choice(['Low', 'Medium', 'High', 'Very High'])}</Data_Sensitivity>
+            <Retention_Policy>{rng.choice([1, 3, 5, 7])} years</Retention_Policy>
+            <Access_Control>Restricted to {escape(rng.choice(owners))}</Access_Control>
+        </dynamic_attributes>
+    </source>
+"""
+    yield '</sources>\n'
+
+def write_synthetic_ccm(output_dir, n_triples, n_domains, n_sources=None, seed=42):
+    """Write knowledge XML, relationship text and triple tables of the given size; returns their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    triples = generate_triples(n_triples, n_domains, seed)
+    paths = {
+        'knowledge': os.path.join(output_dir, 'merged.xml'),
+        'relationships': os.path.join(output_dir, 'merged_knowledge.txt'),
+        'triples': os.path.join(output_dir, 'merged_knowledge.csv'),
+        'domains': os.path.join(output_dir, 'domains.csv')
+    }
+    # Written line by line so multi-million triple files never sit in memory as one string
+    with open(paths['knowledge'], 'w', encoding='utf-8') as f:
+        f.writelines(knowledge_xml_lines(n_sources or max(10, n_triples // 4), seed))
+    with open(paths['relationships'], 'w', encoding='utf-8') as f:
+        f.writelines(relationship_lines(triples))
+    write_table(triples[['Entity A', 'Relationship', 'Entity B']], paths['triples'])
+    write_table(triples, paths['domains'])
+    return paths
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CCM for benchmarking.")
+    parser.add_argument('--output-dir', default='../results/synthetic')
+    parser.add_argument('--triples', type=int, default=10000)
+    parser.add_argument('--domains', type=int, default=100)
+    parser.add_argument('--sources', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    paths = write_synthetic_ccm(args.output_dir, args.triples, args.domains, args.sources, args.seed)
+    for kind, path in paths.items():
+        print(f"{kind}: {path}")
+
+if __name__ == "__main__":
+    main()
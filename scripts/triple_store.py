@@ -0,0 +1,185 @@
+from array import array
+import numpy as np
+import pandas as pd
+
+from columnar_store import is_table, read_table
+from relationship_parser import COLUMNS, parse_file
+
+class StringTable:
+    """Interned strings mapped to dense integer ids, in first-seen order."""
+    __slots__ = ('index', 'strings')
+
+    def __init__(self, strings=()):
+        self.index = {}
+        self.strings = []
+        for text in strings:
+            self.add(text)
+
+    def add(self, text):
+        """Id of a string, adding it to the table if it is new."""
+        string_id = self.index.get(text)
+        if string_id is None:
+            string_id = self.index[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def get(self, text):
+        """Id of a string, or None if it is not in the table."""
+        return self.index.get(text)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def array(self):
+        """The strings as an object array, so ids can be mapped back with fancy indexing."""
+        strings = np.empty(len(self.strings), dtype=object)
+        strings[:] = self.strings
+        return strings
+
+    def sort_ranks(self):
+        """Rank of every string in sorted order; comparing ranks compares the strings."""
+        order = sorted(range(len(self.strings)), key=self.strings.__getitem__)
+        ranks = np.empty(len(order), dtype=np.int32)
+        ranks[order] = np.arange(len(order), dtype=np.int32)
+        return ranks
+
+def csr_index(keys, size):
+    """
+    CSR-style index of an id array: positions of the rows with key i are
+    order[indptr[i]:indptr[i + 1]], in row order.
+    """
+    order = np.argsort(keys, kind='stable').astype(np.int32)
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=indptr[1:])
+    return indptr, order
+
+class TripleStore:
+    """
+    Entity A --Relationship--> Entity B triples with entity and relationship strings interned
+    once, and the triples themselves held as three int32 id arrays. Adjacency indexes by
+    source and target entity are built on first use.
+    """
+
+    def __init__(self, entities, relationships, source, relationship, target):
+        self.entities = entities
+        self.relationships = relationships
+        self.source = np.asarray(source, dtype=np.int32)
+        self.relationship = np.asarray(relationship, dtype=np.int32)
+        self.target = np.asarray(target, dtype=np.int32)
+        self._by_source = None
+        self._by_target = None
+
+    @classmethod
+    def from_triples(cls, triples):
+        """Build a store from an iterable of (source, relationship, target) strings."""
+        entities, relationships = StringTable(), StringTable()
+        source, relationship, target = array('i'), array('i'), array('i')
+        add_entity, add_relationship = entities.add, relationships.add
+        for source_text, relationship_text, target_text in triples:
+            source.append(add_entity(source_text))
+            relationship.append(add_relationship(relationship_text))
+            target.append(add_entity(target_text))
+        return cls(entities, relationships, source, relationship, target)
+
+    @classmethod
+    def from_frame(cls, df, columns=COLUMNS):
+        """Build a store from the Entity A/Relationship/Entity B columns of a frame without a Python loop."""
+        source_column, relationship_column, target_column = columns
+        n_rows = len(df)
+        entity_codes, entity_strings = pd.factorize(
+            pd.concat([df[source_column], df[target_column]], ignore_index=True), use_na_sentinel=False)
+        relationship_codes, relationship_strings = pd.factorize(df[relationship_column], use_na_sentinel=False)
+        return cls(StringTable(entity_strings), StringTable(relationship_strings),
+                   entity_codes[:n_rows], relationship_codes, entity_codes[n_rows:])
+
+    @classmethod
+    def read(cls, path):
+        """Build a store from a triple table (CSV/Parquet/Arrow) or a relationships text file."""
+        if is_table(path):
+            return cls.from_frame(read_table(path, columns=COLUMNS).astype(str))
+        return cls.from_triples(parse_file(path))
+
+    def __len__(self):
+        return len(self.source)
+
+    def __iter__(self):
+        """Triples as strings."""
+        entities, relationships = self.entities.strings, self.relationships.strings
+        for source, relationship, target in zip(self.source.tolist(), self.relationship.tolist(),
+                                                self.target.tolist()):
+            yield entities[source], relationships[relationship], entities[target]
+
+    def take(self, rows):
+        """A store with the given rows, sharing this store's string tables."""
+        return TripleStore(self.entities, self.relationships,
+                           self.source[rows], self.relationship[rows], self.target[rows])
+
+    def to_frame(self, columns=COLUMNS):
+        entities = self.entities.array()
+        relationships = self.relationships.array()
+        return pd.DataFrame({
+            columns[0]: entities[self.source],
+            columns[1]: relationships[self.relationship],
+            columns[2]: entities[self.target]
+        })
+
+    def keys(self):
+        """One int64 per triple, equal exactly when the triples are equal."""
+        entity_bits = max(1, (len(self.entities) - 1).bit_length())
+        relationship_bits = max(1, (len(self.relationships) - 1).bit_length())
+        if 2 * entity_bits + relationship_bits > 63:
+            # Too many distinct strings to pack; number the distinct id rows instead
+            rows = np.stack([self.source, self.relationship, self.target], axis=1)
+            return np.unique(rows, axis=0, return_inverse=True)[1].reshape(-1).astype(np.int64)
+        return ((self.source.astype(np.int64) << (entity_bits + relationship_bits))
+                | (self.relationship.astype(np.int64) << entity_bits)
+                | self.target.astype(np.int64))
+
+    def first_occurrences(self):
+        """Boolean mask of the rows that are the first occurrence of their triple."""
+        _, first = np.unique(self.keys(), return_index=True)
+        mask = np.zeros(len(self), dtype=bool)
+        mask[first] = True
+        return mask
+
+    def unique(self):
+        """The distinct triples, in order of first occurrence."""
+        return self.take(np.flatnonzero(self.first_occurrences()))
+
+    def sorted_order(self):
+        """Row order that sorts the triples by (source, relationship, target) strings."""
+        entity_ranks = self.entities.sort_ranks()
+        relationship_ranks = self.relationships.sort_ranks()
+        return np.lexsort((entity_ranks[self.target], relationship_ranks[self.relationship],
+                           entity_ranks[self.source]))
+
+    def by_source(self):
+        """(indptr, rows) index of the triples leaving each entity."""
+        if self._by_source is None:
+            self._by_source = csr_index(self.source, len(self.entities))
+        return self._by_source
+
+    def by_target(self):
+        """(indptr, rows) index of the triples entering each entity."""
+        if self._by_target is None:
+            self._by_target = csr_index(self.target, len(self.entities))
+        return self._by_target
+
+    def outgoing(self, entity):
+        """Row numbers of the triples whose source is the entity (a string or an id)."""
+        entity_id = self.entities.get(entity) if isinstance(entity, str) else entity
+        if entity_id is None:
+            return np.array([], dtype=np.int32)
+        indptr, rows = self.by_source()
+        return rows[indptr[entity_id]:indptr[entity_id + 1]]
+
+    def incoming(self, entity):
+        """Row numbers of the triples whose target is the entity (a string or an id)."""
+        entity_id = self.entities.get(entity) if isinstance(entity, str) else entity
+        if entity_id is None:
+            return np.array([], dtype=np.int32)
+        indptr, rows = self.by_target()
+        return rows[indptr[entity_id]:indptr[entity_id + 1]]
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from knowledge_loader import iter_sources, SourceMatcher
+from triple_store import TripleStore
+
+UNASSIGNED = 'Unassigned'  # Shard of the triples that match no source
+
+def assign_workflows(df, records):
+    """
+    Workflow of every triple in a frame: the workflow of the first source matching the
+    triple (see knowledge_loader.SourceMatcher), or UNASSIGNED.
+    Lookups are done once per distinct (Entity A, Entity B) pair.
+    """
+    matcher = SourceMatcher(records)
+    store = TripleStore.from_frame(df)
+    entities = store.entities.strings
+    pairs, pair_rows = np.unique(store.source.astype(np.int64) * len(entities) + store.target, return_inverse=True)
+    labels = np.empty(len(pairs), dtype=object)
+    for i, pair in enumerate(pairs.tolist()):
+        matches, _ = matcher.match(entities[pair // len(entities)], entities[pair % len(entities)])
+        labels[i] = (matcher.records[matches[0]].get('Workflow') if matches else None) or UNASSIGNED
+    return labels[pair_rows.reshape(-1)]
+
+def partition(labels):
+    """(workflow, row positions) for every shard, in workflow name order so merges are deterministic."""
+    workflows, codes = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+    codes = codes.reshape(-1)
+    order = np.argsort(codes, kind='stable')
+    return list(zip(workflows.tolist(), np.split(order, np.cumsum(np.bincount(codes))[:-1])))
+
+def workflow_shards(df, knowledge):
+    """Split a triple frame by the workflow sections of the knowledge XML: [(workflow, frame)]."""
+    labels = assign_workflows(df, iter_sources(knowledge))
+    return [(workflow, df.iloc[rows].reset_index(drop=True)) for workflow, rows in partition(labels)]
+
+def map_shards(function, *iterables, workers=None):
+    """
+    Like map(function, *iterables), with one call per shard across a process pool.
+    Results come back in shard order whatever order the workers finish in.
+    """
+    arguments = [list(iterable) for iterable in iterables]
+    n_shards = min(map(len, arguments)) if arguments else 0
+    workers = min(workers or os.cpu_count() or 1, n_shards)
+    if workers <= 1:
+        return list(map(function, *arguments))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, *arguments))